@@ -1,31 +1,75 @@
 import os
-from neo4j import GraphDatabase, Result
+from neo4j import GraphDatabase, Result, ResultSummary
 from pydantic import BaseModel
 from typing import Optional, List
 from treelib import Node, Tree
 from urllib.parse import urlparse
 import uuid
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from src.infra.configuration import Neo4jConfiguration
+from logging import Logger
+
+DOCUMENT_SCHEMA = [
+    'CREATE CONSTRAINT document_id_unique IF NOT EXISTS FOR (d:Document) REQUIRE d.id IS UNIQUE',
+    'CREATE INDEX document_leaf_id IF NOT EXISTS FOR (d:DocumentLeaf) ON (d.id)',
+    'CREATE INDEX document_site_name IF NOT EXISTS FOR (d:Document) ON (d.site_name)',
+    'CREATE INDEX document_leaf_site_name IF NOT EXISTS FOR (d:DocumentLeaf) ON (d.site_name)',
+    'CREATE INDEX document_group_site_name IF NOT EXISTS FOR (d:DocumentGroup) ON (d.site_name)'
+]
 
 class Graph:
-    def __init__(self, configuration: Neo4jConfiguration):
+    def __init__(self, configuration: Neo4jConfiguration, logger: Logger):
         uri = configuration.url
         username = configuration.username
         password = configuration.password
 
+        self.configuration = configuration
+        self.logger = logger
         self.driver = GraphDatabase.driver(uri, auth=(username, password))
 
     def select(self, query: str, args: dict):
         with self.driver.session() as session:
-            result = session.run(query, args)
-            return [dict(record) for record in result]
+            result = session.run(self.__prepare(query), args)
+            records = [dict(record) for record in result]
+            self.__log_profile(query, result.consume())
+            return records
 
     def write(self, transaction_fn, args):
         with (self.driver.session() as session):
             result = session.execute_write(transaction_fn, args)
             return result
 
+    def run(self, tx, query: str, **params) -> list:
+        """Runs the query inside a write transaction and returns its records"""
+        result = tx.run(self.__prepare(query), **params)
+        records = list(result)
+        self.__log_profile(query, result.consume())
+        return records
+
+    def migrate(self, statements: List[str]):
+        """Runs idempotent schema statements, e.g. CREATE CONSTRAINT ... IF NOT EXISTS"""
+        with self.driver.session() as session:
+            for statement in statements:
+                session.run(statement).consume()
+                self.logger.debug(f'Applied graph schema statement: {statement}')
+
+    def __prepare(self, query: str) -> str:
+        return 'PROFILE ' + query if self.configuration.profile_queries else query
+
+    def __log_profile(self, query: str, summary: ResultSummary):
+        if not self.configuration.profile_queries or summary.profile is None:
+            return
+
+        def count_db_hits(operator: dict) -> int:
+            return operator.get('dbHits', 0) + sum(count_db_hits(child) for child in operator.get('children', []))
+
+        statement = ' '.join(query.split())
+        elapsed = (summary.result_available_after or 0) + (summary.result_consumed_after or 0)
+        self.logger.info(f'PROFILE {count_db_hits(summary.profile)} db hits, {summary.profile.get("rows", 0)} rows, '
+                         f'{elapsed} ms: {statement}')
+
 
 class DocumentNode(BaseModel):
     id: str
@@ -34,6 +78,8 @@ class DocumentNode(BaseModel):
     storage_path: Optional[str] = None
     parsing_storage_path: Optional[str] = None
     site_name: Optional[str] = None
+    content_hash: Optional[str] = None
+    is_changed: bool = True
     is_root: bool = False
     is_leaf: bool = False
 
@@ -91,9 +137,51 @@ class DocumentTree:
         DocumentTree.__mark_leaf_nodes(tree)
         return DocumentTree(tree=tree)
 
+    def get_leaf_paths(self) -> dict:
+        """Returns the relative path of every leaf, keyed by the leaf id"""
+        leaf_paths = {}
+        for leaf in self.tree.leaves():
+            if leaf.is_root():
+                continue
+
+            url_sub_path = Path()
+            for node_id in reversed(list(self.tree.rsearch(leaf.identifier))):
+                node = self.tree.get_node(node_id)
+                if not node.is_root():
+                    url_sub_path = url_sub_path.joinpath(node.data.name)
+            leaf_paths[leaf.data.id] = str(url_sub_path)
+
+        return leaf_paths
+
 class DocumentGraph:
     def __init__(self, graph: Graph):
         self.graph = graph
+        # Leaf paths never change once a tree is created, so they are cached for the graph lifetime
+        self.leaf_paths = {}
+        self.loaded_sites = set()
+
+        if graph.configuration.apply_schema:
+            self.ensure_schema()
+
+    def ensure_schema(self):
+        """Creates the constraints and indexes used by the document lookups, if they do not exist yet"""
+        self.graph.migrate(statements=DOCUMENT_SCHEMA)
+
+    def __batches(self, items: list):
+        batch_size = max(1, self.graph.configuration.batch_size)
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+
+    @staticmethod
+    def __labels(node: DocumentNode) -> str:
+        tags = []
+        if node.is_root:
+            tags.append('DocumentGroup')
+        if node.is_leaf:
+            tags.append('DocumentLeaf')
+
+        dynamic_labels = ":".join(tags) if tags else ""
+        return ':' + dynamic_labels if dynamic_labels else ''
 
     def get_leaf_predecessors(self, leaf_id: str) -> List[DocumentNode]:
         query = """
@@ -115,6 +203,7 @@ class DocumentGraph:
             MATCH (n:Document:DocumentLeaf {site_name: $site_name}) 
             RETURN n.id AS id, n.name AS name, n.url AS url, 
                    n.storage_path AS storage_path, n.site_name AS site_name, 
+                   n.content_hash AS content_hash, coalesce(n.is_changed, true) AS is_changed,
                    true AS is_leaf
             """
 
@@ -127,7 +216,8 @@ class DocumentGraph:
             MATCH (n:Document {id: $id}) 
             RETURN n.id AS id, n.name AS name, n.url AS url, 
                    n.storage_path AS storage_path, n.parsing_storage_path as parsing_storage_path,
-                   n.site_name AS site_name
+                   n.site_name AS site_name, n.content_hash AS content_hash,
+                   coalesce(n.is_changed, true) AS is_changed
             """
 
         result = self.graph.select(query=query, args={'id' : document_id})
@@ -137,12 +227,42 @@ class DocumentGraph:
 
         return None
 
-    def get_leaf_path(self, leaf_id: str):
+    def get_leaf_paths(self, site_name: str) -> dict:
+        """Returns the relative path of every leaf of the site keyed by the leaf id, using a single query"""
+        query = """
+            MATCH path = (root:DocumentGroup {site_name: $site_name})-[:HAS_LINK_TO*]->(leaf:DocumentLeaf)
+            RETURN leaf.id AS id, [n IN nodes(path)[1..] | n.name] AS names
+            """
+
+        result = self.graph.select(query=query, args={'site_name': site_name})
+        leaf_paths = {record['id']: str(Path(*record['names'])) for record in result}
+        self.cache_leaf_paths(leaf_paths=leaf_paths)
+        self.loaded_sites.add(site_name)
+        return leaf_paths
+
+    def cache_leaf_paths(self, leaf_paths: dict):
+        self.leaf_paths.update(leaf_paths)
+
+    def get_leaf_path(self, leaf_id: str, site_name: str = None):
+        """
+        Returns the relative path of the leaf from the shared leaf paths cache. On the first cache miss of a site
+        the paths of all its leaves are loaded at once, leaves missing from them are queried one by one and
+        cached too.
+        """
+        if leaf_id in self.leaf_paths:
+            return self.leaf_paths[leaf_id]
+
+        if site_name is not None and site_name not in self.loaded_sites:
+            leaf_paths = self.get_leaf_paths(site_name=site_name)
+            if leaf_id in leaf_paths:
+                return leaf_paths[leaf_id]
+
         url_sub_path = Path()
         leaf_predecessors = self.get_leaf_predecessors(leaf_id=leaf_id)
         for node in reversed(leaf_predecessors):
             url_sub_path = url_sub_path.joinpath(node.name)
 
+        self.leaf_paths[leaf_id] = str(url_sub_path)
         return str(url_sub_path)
 
     def create_relationship(self, relationship: DocumentRelationship):
@@ -152,16 +272,32 @@ class DocumentGraph:
                             MATCH (c:Document {id: $end_document_id})
                             MERGE (p)-[:HAS_LINK_TO]->(c)
                             """
-            result = tx.run(
+            records = self.graph.run(
+                tx,
                 query,
                 start_document_id=args.start_document_id,
                 end_document_id=args.end_document_id
             )
-            return result.single()
+            return records[0] if records else None
 
         relationship_result = self.graph.write(transaction_fn=create_relationship_tx, args=relationship)
         return relationship_result
 
+    def create_relationships(self, relationships: List[DocumentRelationship]):
+        """Creates the relationships with one UNWIND query per batch"""
+        def create_relationships_tx(tx, rows: List[dict]):
+            query = """
+                UNWIND $rows AS row
+                MATCH (p:Document {id: row.start_document_id})
+                MATCH (c:Document {id: row.end_document_id})
+                MERGE (p)-[:HAS_LINK_TO]->(c)
+                """
+            return self.graph.run(tx, query, rows=rows)
+
+        for batch in self.__batches(relationships):
+            rows = [relationship.model_dump() for relationship in batch]
+            self.graph.write(transaction_fn=create_relationships_tx, args=rows)
+
     def update_node(self, node: DocumentNode):
         def update_node_tx(tx, args: DocumentNode):
             query = """
@@ -170,28 +306,45 @@ class DocumentGraph:
                     d.site_name = $site_name,
                     d.url = $url,
                     d.storage_path = $storage_path,
-                    d.parsing_storage_path = $parsing_storage_path
+                    d.parsing_storage_path = $parsing_storage_path,
+                    d.content_hash = $content_hash,
+                    d.is_changed = $is_changed
                     RETURN d
             """
             params = args.model_dump()
-            result = tx.run(query, **params)
-            return result.single()
+            records = self.graph.run(tx, query, **params)
+            return records[0] if records else None
 
         node_result = self.graph.write(transaction_fn=update_node_tx, args=node)
         return node_result
 
-    def create_node(self, node: DocumentNode):
-        def create_node_tx(tx, args: DocumentNode):
-            tags = []
-            if args.is_root:
-                tags.append('DocumentGroup')
-            if args.is_leaf:
-                tags.append('DocumentLeaf')
+    def update_nodes(self, nodes: List[DocumentNode]) -> List[str]:
+        """Updates the nodes with one UNWIND query per batch and returns the ids of the nodes that were found"""
+        def update_nodes_tx(tx, rows: List[dict]):
+            query = """
+                UNWIND $rows AS row
+                MATCH (d:Document {id: row.id})
+                SET d.name = row.name,
+                    d.site_name = row.site_name,
+                    d.url = row.url,
+                    d.storage_path = row.storage_path,
+                    d.parsing_storage_path = row.parsing_storage_path,
+                    d.content_hash = row.content_hash,
+                    d.is_changed = row.is_changed
+                RETURN d.id AS id
+                """
+            return [record['id'] for record in self.graph.run(tx, query, rows=rows)]
 
-            dynamic_labels = ":".join(tags) if tags else ""
+        updated_ids = []
+        for batch in self.__batches(nodes):
+            rows = [node.model_dump() for node in batch]
+            updated_ids.extend(self.graph.write(transaction_fn=update_nodes_tx, args=rows))
+        return updated_ids
 
+    def create_node(self, node: DocumentNode):
+        def create_node_tx(tx, args: DocumentNode):
             query = f"""
-            CREATE (d:Document{':' + dynamic_labels if dynamic_labels else ''} {{
+            CREATE (d:Document{self.__labels(args)} {{
                 id: $id,
                 name: $name,
                 site_name: $site_name,
@@ -202,8 +355,114 @@ class DocumentGraph:
             """
 
             params = args.model_dump()
-            result = tx.run(query, **params)
-            return result.single()
+            records = self.graph.run(tx, query, **params)
+            return records[0] if records else None
 
         node_result = self.graph.write(transaction_fn=create_node_tx, args=node)
         return node_result
+
+    def create_nodes(self, nodes: List[DocumentNode]):
+        """Creates the nodes with one UNWIND query per batch of nodes sharing the same labels"""
+        def create_nodes_tx(tx, args: dict):
+            query = f"""
+            UNWIND $rows AS row
+            CREATE (d:Document{args['labels']} {{
+                id: row.id,
+                name: row.name,
+                site_name: row.site_name,
+                url: row.url,
+                storage_path: row.storage_path
+            }})
+            """
+            return self.graph.run(tx, query, rows=args['rows'])
+
+        nodes_by_labels = {}
+        for node in nodes:
+            nodes_by_labels.setdefault(self.__labels(node), []).append(node)
+
+        for labels, labeled_nodes in nodes_by_labels.items():
+            for batch in self.__batches(labeled_nodes):
+                rows = [node.model_dump() for node in batch]
+                self.graph.write(transaction_fn=create_nodes_tx, args={'labels': labels, 'rows': rows})
+
+class NodeCacheStatistics(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+    max_size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class CachedDocumentGraph(DocumentGraph):
+    """
+    DocumentGraph with a bounded LRU read-through cache of the document nodes by id. Updated nodes are
+    written through to the cache when the update found them, and created nodes invalidate their entries.
+    """
+
+    def __init__(self, graph: Graph):
+        super().__init__(graph=graph)
+        self.max_size = max(0, graph.configuration.node_cache_size)
+        self.nodes = OrderedDict()
+        self.nodes_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_document_node_by_id(self, document_id: str) -> DocumentNode | None:
+        with self.nodes_lock:
+            node = self.nodes.get(document_id)
+            if node is not None:
+                self.nodes.move_to_end(document_id)
+                self.hits += 1
+                return node.model_copy()
+            self.misses += 1
+
+        node = super().get_document_node_by_id(document_id=document_id)
+        if node is not None:
+            self.__store(node)
+        return node
+
+    def update_node(self, node: DocumentNode):
+        node_result = super().update_node(node=node)
+        if node_result is not None:
+            self.__store(node)
+        return node_result
+
+    def update_nodes(self, nodes: List[DocumentNode]) -> List[str]:
+        updated_ids = super().update_nodes(nodes=nodes)
+        found_ids = set(updated_ids)
+        for node in nodes:
+            if node.id in found_ids:
+                self.__store(node)
+        return updated_ids
+
+    def create_node(self, node: DocumentNode):
+        node_result = super().create_node(node=node)
+        self.__invalidate([node.id])
+        return node_result
+
+    def create_nodes(self, nodes: List[DocumentNode]):
+        super().create_nodes(nodes=nodes)
+        self.__invalidate([node.id for node in nodes])
+
+    def get_cache_statistics(self) -> NodeCacheStatistics:
+        with self.nodes_lock:
+            return NodeCacheStatistics(hits=self.hits, misses=self.misses, size=len(self.nodes),
+                                       max_size=self.max_size)
+
+    def __store(self, node: DocumentNode):
+        if self.max_size == 0:
+            return
+
+        with self.nodes_lock:
+            self.nodes[node.id] = node.model_copy()
+            self.nodes.move_to_end(node.id)
+            while len(self.nodes) > self.max_size:
+                self.nodes.popitem(last=False)
+
+    def __invalidate(self, document_ids: List[str]):
+        with self.nodes_lock:
+            for document_id in document_ids:
+                self.nodes.pop(document_id, None)
@@ -1,25 +1,156 @@
+import time
+import queue
+import atexit
+import threading
 from elasticsearch import Elasticsearch
 from datetime import datetime
 from abc import ABC, abstractmethod
+from pydantic import BaseModel
 from src.infra.configuration import ElasticsearchConfiguration
+from logging import Logger
 
 class IReportClient(ABC):
     @abstractmethod
     def report(self, record: dict):
         pass
 
+def create_elasticsearch_client(configuration: ElasticsearchConfiguration) -> Elasticsearch:
+    host = configuration.endpoint
+    username = configuration.username
+    password = configuration.password
+    return Elasticsearch(
+        [host],
+        basic_auth=(username, password),
+        verify_certs=False
+    )
+
 class ReportClient(IReportClient):
     def __init__(self, configuration: ElasticsearchConfiguration):
-        host = configuration.endpoint
-        username = configuration.username
-        password = configuration.password
-        self.es = Elasticsearch(
-            [host],
-            basic_auth=(username, password),
-            verify_certs=False
-        )
+        self.configuration = configuration
+        self.es = create_elasticsearch_client(configuration=configuration)
+
+
+    def report(self, record: dict):
+        response = self.es.index(index=self.configuration.index, document=record)
+        return response
+
+class ReportingStatistics(BaseModel):
+    queued: int = 0
+    sent: int = 0
+    dropped: int = 0
+    failed: int = 0
+    flushes: int = 0
 
+class BulkReportClient(IReportClient):
+    """
+    Non blocking report client: records are put on a bounded queue and a background worker indexes them with
+    the bulk API once report_batch_size records are waiting or report_flush_interval_seconds have passed.
+    When the queue is full a record is dropped, or with the 'block' overflow policy the caller waits up to
+    report_block_timeout_seconds before it is dropped. Queued records are flushed on close and on exit, records
+    reported after close are dropped with a warning.
+    """
+
+    OVERFLOW_POLICIES = ['drop', 'block']
+
+    def __init__(self, configuration: ElasticsearchConfiguration, logger: Logger):
+        if configuration.report_overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f'Unsupported report overflow policy {configuration.report_overflow_policy}, '
+                             f'expected one of {self.OVERFLOW_POLICIES}')
+
+        self.configuration = configuration
+        self.logger = logger
+        self.es = create_elasticsearch_client(configuration=configuration)
+        self.records = queue.Queue(maxsize=configuration.report_queue_size)
+        self.statistics = ReportingStatistics()
+        self.statistics_lock = threading.Lock()
+        self.stopped = threading.Event()
+        # close waits for the records being enqueued, so none is left behind the stopped worker
+        self.closed = False
+        self.reporting = 0
+        self.reporting_condition = threading.Condition()
+
+        self.worker = threading.Thread(target=self.__run, name='bulk-report-worker', daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
 
     def report(self, record: dict):
-        response = self.es.index(index="coding-assistant", document=record)
-        return response
\ No newline at end of file
+        with self.reporting_condition:
+            if self.closed:
+                self.__count(dropped=1)
+                self.logger.warning('Report client is closed, dropping a report record')
+                return
+            self.reporting += 1
+
+        try:
+            if self.configuration.report_overflow_policy == 'block':
+                self.records.put(record, timeout=self.configuration.report_block_timeout_seconds)
+            else:
+                self.records.put_nowait(record)
+        except queue.Full:
+            self.__count(dropped=1)
+            self.logger.warning('Report queue is full, dropping a report record')
+            return
+        finally:
+            with self.reporting_condition:
+                self.reporting -= 1
+                self.reporting_condition.notify_all()
+        self.__count(queued=1)
+
+    def close(self, timeout_seconds: float = 10.0):
+        """Stops the worker after it flushed the queued records"""
+        with self.reporting_condition:
+            if not self.closed:
+                self.closed = True
+                self.reporting_condition.wait_for(lambda: self.reporting == 0)
+                self.stopped.set()
+        self.worker.join(timeout=timeout_seconds)
+        if self.worker.is_alive():
+            self.logger.warning(f'Report worker did not flush in {timeout_seconds}s, '
+                                f'{self.records.qsize()} records were not sent')
+
+    def get_statistics(self) -> ReportingStatistics:
+        with self.statistics_lock:
+            return self.statistics.model_copy()
+
+    def __run(self):
+        batch = []
+        flush_at = time.monotonic() + self.configuration.report_flush_interval_seconds
+        while not self.stopped.is_set() or not self.records.empty():
+            try:
+                batch.append(self.records.get(timeout=max(0.0, min(flush_at - time.monotonic(), 0.1))))
+            except queue.Empty:
+                pass
+
+            is_due = time.monotonic() >= flush_at or self.stopped.is_set()
+            if len(batch) >= self.configuration.report_batch_size or (batch and is_due):
+                self.__flush(batch)
+                batch = []
+            if is_due:
+                flush_at = time.monotonic() + self.configuration.report_flush_interval_seconds
+
+        if batch:
+            self.__flush(batch)
+
+    def __flush(self, batch: list):
+        operations = []
+        for record in batch:
+            operations.append({'index': {'_index': self.configuration.index}})
+            operations.append(record)
+
+        try:
+            response = self.es.bulk(operations=operations)
+        except Exception as e:
+            self.__count(failed=len(batch), flushes=1)
+            self.logger.error(f'Unable to send {len(batch)} report records: {e}')
+            return
+
+        failed = 0
+        if response.get('errors'):
+            failed = sum(1 for item in response['items'] if 'error' in item.get('index', {}))
+            self.logger.error(f'{failed} of {len(batch)} report records were rejected')
+        self.__count(sent=len(batch) - failed, failed=failed, flushes=1)
+
+    def __count(self, **counts):
+        with self.statistics_lock:
+            for name, count in counts.items():
+                setattr(self.statistics, name, getattr(self.statistics, name) + count)
@@ -1,43 +1,190 @@
 from abc import ABC, abstractmethod
 from src.data_access.reporting import ReportClient, IReportClient
 from src.infra.configuration import ChatConfiguration
-from ollama import Client
-from pydantic import BaseModel
+from ollama import Client, AsyncClient
+from pydantic import BaseModel, Field
+from typing import Optional, AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
 from src.rag.vector_store import IVectorStoreRetriever
+from src.inference.retrieval_cache import SemanticRetrievalCache, RetrievalCacheStatistics
+from src.infra.metrics import IMetricsSink
+from logging import Logger
+import asyncio
 import copy
+import time
 import uuid
 from datetime import datetime
 
+SYSTEM_PROMPT = ("You are a coding assistant specialized in the LangGraph library. "
+                 "Utilize the provided CONTEXT to answer the QUESTION. If the CONTEXT lacks sufficient information, "
+                 "respond with I don't know based on the provided context.")
+
+QUERY_EMBEDDING_SPAN = 'chat.query_embedding_seconds'
+VECTOR_SEARCH_SPAN = 'chat.vector_search_seconds'
+PROMPT_ASSEMBLY_SPAN = 'chat.prompt_assembly_seconds'
+TIME_TO_FIRST_TOKEN_SPAN = 'chat.time_to_first_token_seconds'
+GENERATION_SPAN = 'chat.generation_seconds'
+TOKENS_PER_SECOND = 'chat.tokens_per_second'
+
 class CompletionRequest(BaseModel):
-    request_id: str = str(uuid.uuid4())
+    request_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     messages: list = [dict[str, str]]
+    metadata_filter: Optional[dict] = None
 
 
 class CompletionStream:
-    def __init__(self, stream):
+    """
+    Token stream of a completion. spans holds the durations of the request stages in seconds, and the generation
+    speed in tokens/sec once the stream was consumed, every span is also recorded to the metrics sink.
+    """
+
+    def __init__(self, stream, metrics_sink: Optional[IMetricsSink] = None, started_at: Optional[float] = None):
         self.stream = stream
         self.vector_search_result = []
+        self.spans = {}
+        self.metrics_sink = metrics_sink
+        self.started_at = time.perf_counter() if started_at is None else started_at
 
     def yield_chunks(self):
         for chunk in self.stream:
+            self.on_chunk(chunk)
             # Extract text from the chunk
             chunk_text = chunk['message']['content']
             yield chunk_text
+        self.record_span(GENERATION_SPAN, time.perf_counter() - self.started_at)
+
+    def record_span(self, name: str, value: float):
+        self.spans[name] = value
+        if self.metrics_sink is not None:
+            self.metrics_sink.record(name=name, value=value)
+
+    def on_chunk(self, chunk):
+        if TIME_TO_FIRST_TOKEN_SPAN not in self.spans:
+            self.record_span(TIME_TO_FIRST_TOKEN_SPAN, time.perf_counter() - self.started_at)
+
+        # The final chunk carries the number of generated tokens and the generation time in nanoseconds
+        if chunk.get('done') and chunk.get('eval_count') and chunk.get('eval_duration'):
+            self.record_span(TOKENS_PER_SECOND, chunk['eval_count'] / chunk['eval_duration'] * 1e9)
+
+class AsyncCompletionStream(CompletionStream):
+    async def yield_chunks(self) -> AsyncIterator[str]:
+        async for chunk in self.stream:
+            self.on_chunk(chunk)
+            yield chunk['message']['content']
+        self.record_span(GENERATION_SPAN, time.perf_counter() - self.started_at)
 
 class IChatClient(ABC):
     @abstractmethod
     def completion_stream(self, request: CompletionRequest):
         pass
 
+class IAsyncChatClient(ABC):
+    @abstractmethod
+    async def completion_stream(self, request: CompletionRequest) -> AsyncCompletionStream:
+        pass
+
+class ChatPrompt(BaseModel):
+    """Messages sent to the model, along with the retrieved chunks and the report record of the request"""
+    messages: list
+    vector_search_result: list
+    report_record: dict
+    spans: dict = {}
+
+class ChatContextRetriever:
+    """Retrieves the chunks of a question and assembles the prompt, shared by the sync and async chat clients"""
+
+    def __init__(self, vector_store_retriever: IVectorStoreRetriever, configuration: ChatConfiguration):
+        self.configuration = configuration
+        self.vector_store_retriever = vector_store_retriever
+        self.retrieval_cache = SemanticRetrievalCache(
+            max_size=configuration.completion.retrieval_cache_size,
+            similarity_threshold=configuration.completion.retrieval_cache_similarity
+        )
+
+    def create_prompt(self, request: CompletionRequest) -> ChatPrompt:
+        started_at = time.perf_counter()
+        spans = {}
+        message_history = [{ 'role': 'system', 'content': SYSTEM_PROMPT }] + copy.deepcopy(request.messages)
+        prompt = message_history[len(message_history) - 1]
+
+        initial_user_prompt = prompt['content']
+        prompt_content = 'QUESTION: ' + initial_user_prompt
+
+        chunks_to_retrieve = self.configuration.completion.chunk_number
+        metadata_filter = request.metadata_filter
+        if metadata_filter is None and self.configuration.completion.site_name:
+            metadata_filter = {'site_name': self.configuration.completion.site_name}
+
+        vector_search_result, context = self.retrieve(
+            query=prompt_content,
+            k=chunks_to_retrieve,
+            metadata_filter=metadata_filter,
+            spans=spans
+        )
+        prompt['content'] = prompt_content + context
+
+        # One record per request, carrying all of its chunks
+        record = {
+            "@timestamp": datetime.now().isoformat(),
+            "requestId": request.request_id,
+            "userPrompt" : initial_user_prompt,
+            "chunks" : [chunk.page_content for chunk in vector_search_result]
+        }
+        retrieval_seconds = spans.get(QUERY_EMBEDDING_SPAN, 0.0) + spans.get(VECTOR_SEARCH_SPAN, 0.0)
+        spans[PROMPT_ASSEMBLY_SPAN] = time.perf_counter() - started_at - retrieval_seconds
+        return ChatPrompt(messages=message_history, vector_search_result=vector_search_result, report_record=record,
+                          spans=spans)
+
+    def retrieve(self, query: str, k: int, metadata_filter: Optional[dict], spans: Optional[dict] = None):
+        """
+        Returns the chunks retrieved for the query and the CONTEXT block assembled from them, reusing the result
+        of a semantically close cached query when the vector store has not changed since
+        """
+        spans = {} if spans is None else spans
+        started_at = time.perf_counter()
+        query_vector = self.vector_store_retriever.embed_query(query=query)
+        embedded_at = time.perf_counter()
+        spans[QUERY_EMBEDDING_SPAN] = embedded_at - started_at
+
+        version = self.vector_store_retriever.version() if self.retrieval_cache.max_size > 0 else None
+
+        cached = self.retrieval_cache.get(vector=query_vector, k=k, metadata_filter=metadata_filter, version=version)
+        if cached is not None:
+            spans[VECTOR_SEARCH_SPAN] = time.perf_counter() - embedded_at
+            return cached.vector_search_result, cached.context
+
+        vector_search_result = self.vector_store_retriever.query_by_vector(
+            vector=query_vector,
+            k=k,
+            metadata_filter=metadata_filter
+        )
+        spans[VECTOR_SEARCH_SPAN] = time.perf_counter() - embedded_at
+
+        context = ''
+        if len(vector_search_result) > 0:
+            context = '\nCONTEXT: '
+            for chunk in vector_search_result:
+                context += '\n' + chunk.page_content
+
+        self.retrieval_cache.put(vector=query_vector, k=k, metadata_filter=metadata_filter, version=version,
+                                 vector_search_result=vector_search_result, context=context)
+        return vector_search_result, context
+
 class OllamaChatClient(IChatClient):
     def __init__(
             self,
             vector_store_retriever: IVectorStoreRetriever,
             report_client: IReportClient,
-            configuration: ChatConfiguration
+            configuration: ChatConfiguration,
+            metrics_sink: IMetricsSink
     ):
         self.configuration = configuration
         self.vector_store_retriever =vector_store_retriever
+        self.metrics_sink = metrics_sink
+        self.context_retriever = ChatContextRetriever(
+            vector_store_retriever=vector_store_retriever,
+            configuration=configuration
+        )
 
         host = configuration.ollama.host
         self.client = Client(host=host)
@@ -45,39 +192,84 @@ class OllamaChatClient(IChatClient):
 
     def completion_stream(self, request: CompletionRequest):
         model = self.configuration.ollama.version
-        messages = request.messages
-        system_prompt = ("You are a coding assistant specialized in the LangGraph library. "
-                         "Utilize the provided CONTEXT to answer the QUESTION. If the CONTEXT lacks sufficient information, "
-                         "respond with I don't know based on the provided context.")
+        chat_prompt = self.context_retriever.create_prompt(request=request)
+        self.report_client.report(record=chat_prompt.report_record)
 
-        message_history = [{ 'role': 'system', 'content': system_prompt }] + copy.deepcopy(messages)
-        prompt = message_history[len(message_history) - 1]
+        started_at = time.perf_counter()
+        stream = self.client.chat(model=model, messages=chat_prompt.messages, stream=True)
 
-        initial_user_prompt = prompt['content']
-        prompt_content = 'QUESTION: ' + initial_user_prompt
+        completion = CompletionStream(stream=stream, metrics_sink=self.metrics_sink, started_at=started_at)
+        completion.vector_search_result = chat_prompt.vector_search_result
+        for name, value in chat_prompt.spans.items():
+            completion.record_span(name, value)
 
-        chunks_to_retrieve = self.configuration.completion.chunk_number
-        vector_search_result = self.vector_store_retriever.query(query=prompt_content, k=chunks_to_retrieve)
+        return completion
 
+    def retrieve(self, query: str, k: int, metadata_filter: Optional[dict]):
+        return self.context_retriever.retrieve(query=query, k=k, metadata_filter=metadata_filter)
 
+    def get_retrieval_cache_statistics(self) -> RetrievalCacheStatistics:
+        return self.context_retriever.retrieval_cache.get_statistics()
 
-        if len(vector_search_result) > 0:
-            prompt_content += '\nCONTEXT: '
-            for chunk in vector_search_result:
-                prompt_content += '\n' + chunk.page_content
+class AsyncOllamaChatClient(IAsyncChatClient):
+    """
+    Chat client for asyncio servers. The CPU bound query embedding and vector search run on a thread pool and
+    the report is sent in the background on a thread of its own, so a slow report never holds up retrieval and
+    the event loop only waits on Ollama and serves other conversations meanwhile.
+    """
+
+    def __init__(
+            self,
+            vector_store_retriever: IVectorStoreRetriever,
+            report_client: IReportClient,
+            configuration: ChatConfiguration,
+            metrics_sink: IMetricsSink,
+            logger: Logger
+    ):
+        self.configuration = configuration
+        self.metrics_sink = metrics_sink
+        self.logger = logger
+        self.context_retriever = ChatContextRetriever(
+            vector_store_retriever=vector_store_retriever,
+            configuration=configuration
+        )
+        self.client = AsyncClient(host=configuration.ollama.host)
+        self.report_client = report_client
+        self.executor = ThreadPoolExecutor(
+            max_workers=configuration.completion.executor_workers,
+            thread_name_prefix='chat-retrieval'
+        )
+        self.report_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-report')
+        self.report_tasks = set()
+
+    async def completion_stream(self, request: CompletionRequest) -> AsyncCompletionStream:
+        loop = asyncio.get_running_loop()
+        chat_prompt = await loop.run_in_executor(self.executor, self.context_retriever.create_prompt, request)
+        self.__report(loop=loop, record=chat_prompt.report_record)
+
+        started_at = time.perf_counter()
+        stream = await self.client.chat(
+            model=self.configuration.ollama.version,
+            messages=chat_prompt.messages,
+            stream=True
+        )
 
-                record = {
-                    "@timestamp": datetime.now().isoformat(),
-                    "requestId": request.request_id,
-                    "userPrompt" : initial_user_prompt,
-                    "chunk" : chunk.page_content
-                }
-                self.report_client.report(record=record)
+        completion = AsyncCompletionStream(stream=stream, metrics_sink=self.metrics_sink, started_at=started_at)
+        completion.vector_search_result = chat_prompt.vector_search_result
+        for name, value in chat_prompt.spans.items():
+            completion.record_span(name, value)
+        return completion
 
-        prompt['content'] = prompt_content
-        stream = self.client.chat(model=model, messages=message_history, stream=True)
+    def get_retrieval_cache_statistics(self) -> RetrievalCacheStatistics:
+        return self.context_retriever.retrieval_cache.get_statistics()
 
-        completion = CompletionStream(stream=stream)
-        completion.vector_search_result = vector_search_result
+    def __report(self, loop: asyncio.AbstractEventLoop, record: dict):
+        task = loop.run_in_executor(self.report_executor, self.report_client.report, record)
+        # The loop keeps weak references to tasks, a finished report removes itself from the set
+        self.report_tasks.add(task)
+        task.add_done_callback(self.__on_reported)
 
-        return completion
\ No newline at end of file
+    def __on_reported(self, task: asyncio.Future):
+        self.report_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f'Unable to report a chat request: {task.exception()}')
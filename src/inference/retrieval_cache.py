@@ -0,0 +1,115 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Any
+import numpy as np
+from pydantic import BaseModel
+
+class RetrievalCacheStatistics(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    entries: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class RetrievalCacheEntry(BaseModel):
+    search_key: str
+    vector_search_result: List[Any]
+    context: str
+
+class SemanticRetrievalCache:
+    """
+    Bounded LRU of retrieval results keyed by query embedding. A lookup hits when a cached query of the same k
+    and metadata filter has a cosine similarity of at least similarity_threshold. The whole cache is dropped
+    when the version of the vector store changes.
+    """
+
+    def __init__(self, max_size: int, similarity_threshold: float):
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self.lock = threading.Lock()
+        self.statistics = RetrievalCacheStatistics()
+        self.version = None
+        # Entries live in the slots of a preallocated matrix, so a lookup is one matrix-vector product
+        self.vectors: Optional[np.ndarray] = None
+        self.occupied = np.zeros(max_size, dtype=bool)
+        self.entries: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def search_key(k: int, metadata_filter: Optional[dict]) -> str:
+        return json.dumps({'k': k, 'filter': metadata_filter}, sort_keys=True)
+
+    def get(self, vector: List[float], k: int, metadata_filter: Optional[dict], version) -> Optional[RetrievalCacheEntry]:
+        if self.max_size <= 0:
+            return None
+
+        query_vector = self.__normalize(vector)
+        search_key = self.search_key(k=k, metadata_filter=metadata_filter)
+        with self.lock:
+            self.__validate(version=version)
+            if self.entries and len(query_vector) == self.vectors.shape[1]:
+                scores = self.vectors @ query_vector
+                scores[~self.occupied] = -np.inf
+                matches = np.flatnonzero(scores >= self.similarity_threshold)
+                for slot in matches[np.argsort(-scores[matches])]:
+                    entry = self.entries[int(slot)]
+                    if entry.search_key == search_key:
+                        self.entries.move_to_end(int(slot))
+                        self.statistics.hits += 1
+                        return entry
+
+            self.statistics.misses += 1
+            return None
+
+    def put(self, vector: List[float], k: int, metadata_filter: Optional[dict], version,
+            vector_search_result: list, context: str):
+        if self.max_size <= 0:
+            return
+
+        query_vector = self.__normalize(vector)
+        with self.lock:
+            self.__validate(version=version)
+            if self.vectors is None or self.vectors.shape[1] != len(query_vector):
+                self.vectors = np.zeros((self.max_size, len(query_vector)), dtype=np.float32)
+                self.occupied[:] = False
+                self.entries.clear()
+
+            if len(self.entries) < self.max_size:
+                slot = int(np.flatnonzero(~self.occupied)[0])
+            else:
+                slot, _ = self.entries.popitem(last=False)
+                self.statistics.evictions += 1
+
+            self.vectors[slot] = query_vector
+            self.occupied[slot] = True
+            self.entries[slot] = RetrievalCacheEntry(
+                search_key=self.search_key(k=k, metadata_filter=metadata_filter),
+                vector_search_result=vector_search_result,
+                context=context
+            )
+            self.statistics.entries = len(self.entries)
+
+    def get_statistics(self) -> RetrievalCacheStatistics:
+        with self.lock:
+            return self.statistics.model_copy()
+
+    def __validate(self, version):
+        if version == self.version:
+            return
+        if self.entries:
+            self.statistics.invalidations += 1
+        self.entries.clear()
+        self.occupied[:] = False
+        self.statistics.entries = 0
+        self.version = version
+
+    @staticmethod
+    def __normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -11,31 +11,88 @@ class Neo4jConfiguration(BaseModel):
     url: str
     username: str
     password: str
+    batch_size: int = 1000
+    apply_schema: bool = True
+    profile_queries: bool = False
+    node_cache_size: int = 10000
 
 class ElasticsearchConfiguration(BaseModel):
     endpoint: str
     username: str
     password: str
+    index: str = 'coding-assistant'
+    reporting_mode: str = 'bulk'
+    report_queue_size: int = 10000
+    report_batch_size: int = 500
+    report_flush_interval_seconds: float = 2.0
+    report_overflow_policy: str = 'drop'
+    report_block_timeout_seconds: float = 0.05
 
 class ScrappingConfiguration(BaseModel):
     storage_path: str
+    scrapper_type: str = 'pdf'
+    max_concurrency: int = 1
+    max_concurrency_per_host: int = 4
+    max_retries: int = 3
+    retry_backoff_seconds: float = 1.0
+    progress_log_interval: int = 50
+    crawl_depth: int = 1
+    crawl_keep_query: bool = False
+    request_timeout_seconds: float = 30.0
+    http_cache_enabled: bool = True
+    wkhtmltopdf_path: Optional[str] = None
+    # Defaults to max_concurrency, a worker per scrapping thread
+    renderer_pool_size: Optional[int] = None
+    renderer_timeout_seconds: float = 120.0
+    renderer_max_jobs_per_worker: int = 200
 
 class ParsingConfiguration(BaseModel):
     storage_path: str
+    parser_type: str = 'pdf'
+    max_workers: Optional[int] = None
+    streaming: bool = False
+    page_batch_size: int = 16
 
 class HuggingFaceEmbeddingConfiguration(BaseModel):
     model_name: str
     persist_directory: str
+    encode_batch_size: int = 64
+    cache_enabled: bool = False
+    cache_max_size_mb: int = 1024
+    encode_processes: int = 1
+    intra_op_threads: Optional[int] = None
+    multi_process_min_chunks: int = 256
+    backend: str = 'torch'
+    onnx_quantization: Optional[str] = None
+    # The model is never downloaded unless this is turned off, it is expected in persist_directory
+    local_files_only: bool = True
+    query_cache_size: int = 1024
+    query_cache_ttl_seconds: float = 3600.0
 
 class ChromaDBConfiguration(BaseModel):
     persist_directory: str
     collection_name: str
+    distance_metric: Optional[str] = None
+    hnsw_m: Optional[int] = None
+    hnsw_construction_ef: Optional[int] = None
+    hnsw_search_ef: Optional[int] = None
+
+class NumpyIndexConfiguration(BaseModel):
+    persist_directory: str
+    collection_name: str
+    compaction_threshold: float = 0.2
+    storage_type: str = 'float32'
+    pca_dimension: Optional[int] = None
+    rescore_candidates: int = 0
 
 class EmbeddingConfiguration(BaseModel):
     huggingface_embedding: Optional[HuggingFaceEmbeddingConfiguration] = None
     chunk_size: int = 1000
     chunk_overlap: int = 100
+    batch_size: int = 512
+    vector_store: str = 'chroma'
     chroma_db: Optional[ChromaDBConfiguration] = None
+    numpy_index: Optional[NumpyIndexConfiguration] = None
 
 class OllamaConfiguration(BaseModel):
     host: str
@@ -43,11 +100,17 @@ class OllamaConfiguration(BaseModel):
 
 class CompletionConfiguration(BaseModel):
     chunk_number: int = 5
+    site_name: Optional[str] = None
+    retrieval_cache_size: int = 0
+    retrieval_cache_similarity: float = 0.95
+    executor_workers: int = 4
 
 class ChatConfiguration(BaseModel):
     ollama: Optional[OllamaConfiguration] = None
     huggingface_embedding: Optional[HuggingFaceEmbeddingConfiguration] = None
+    vector_store: str = 'chroma'
     chroma_db: Optional[ChromaDBConfiguration] = None
+    numpy_index: Optional[NumpyIndexConfiguration] = None
     completion: Optional[CompletionConfiguration] = None
 
 
@@ -1,11 +1,13 @@
 from dependency_injector import  containers, providers
 from dependency_injector.containers import DeclarativeContainer
 from src.rag.vector_store import ChromaDbVectorStoreRetriever
+from src.rag.numpy_vector_store import NumpyVectorStoreRetriever
 from src.infra.configuration import ConfigurationManager
-from src.inference.chatbots import OllamaChatClient
+from src.inference.chatbots import OllamaChatClient, AsyncOllamaChatClient
 from src.infra.logging_infra import logger
-from src.data_access.graphs import Graph, DocumentGraph
-from src.data_access.reporting import ReportClient
+from src.data_access.graphs import Graph, CachedDocumentGraph
+from src.data_access.reporting import ReportClient, BulkReportClient
+from src.infra.metrics import InMemoryHistogramSink
 
 class InferenceDIContainer(DeclarativeContainer):
     config = providers.Configuration()
@@ -15,35 +17,57 @@ class InferenceDIContainer(DeclarativeContainer):
     neo4j_config = providers.Singleton(config.neo4j)
     neo4j_graph = providers.Singleton(
         Graph,
-        configuration=neo4j_config
+        configuration=neo4j_config,
+        logger=logger
     )
 
     document_graph = providers.Singleton(
-        DocumentGraph,
+        CachedDocumentGraph,
         graph=neo4j_graph
     )
 
     elasticsearch_config = providers.Singleton(config.elasticsearch)
-    report_client = providers.Singleton(
-        ReportClient,
-        configuration=elasticsearch_config
+    report_client = providers.Selector(
+        providers.Callable(lambda configuration: configuration.reporting_mode, elasticsearch_config),
+        sync=providers.Singleton(ReportClient, configuration=elasticsearch_config),
+        bulk=providers.Singleton(BulkReportClient, configuration=elasticsearch_config, logger=logger)
     )
 
+    chat_config = providers.Singleton(config.chat)
+    metrics_sink = providers.Singleton(InMemoryHistogramSink)
     chat_vector_db_config = providers.Singleton(config.chat_vector_db)
+    chat_numpy_index_config = providers.Singleton(config.chat_numpy_index)
     chat_embedding_model_config = providers.Singleton(config.chat_embedding_model)
-    chat_vector_store_retriever = providers.Singleton(
-        ChromaDbVectorStoreRetriever,
-        chroma_db_config=chat_vector_db_config,
-        huggingface_embed_config=chat_embedding_model_config,
-        logger=logger
+    chat_vector_store_retriever = providers.Selector(
+        providers.Callable(lambda configuration: configuration.vector_store, chat_config),
+        chroma=providers.Singleton(
+            ChromaDbVectorStoreRetriever,
+            chroma_db_config=chat_vector_db_config,
+            huggingface_embed_config=chat_embedding_model_config,
+            logger=logger
+        ),
+        numpy=providers.Singleton(
+            NumpyVectorStoreRetriever,
+            numpy_index_config=chat_numpy_index_config,
+            huggingface_embed_config=chat_embedding_model_config,
+            logger=logger
+        )
     )
 
-    chat_config = providers.Singleton(config.chat)
     chat_client = providers.Singleton(
         OllamaChatClient,
         vector_store_retriever=chat_vector_store_retriever,
         report_client=report_client,
-        configuration=chat_config
+        configuration=chat_config,
+        metrics_sink=metrics_sink
+    )
+    async_chat_client = providers.Singleton(
+        AsyncOllamaChatClient,
+        vector_store_retriever=chat_vector_store_retriever,
+        report_client=report_client,
+        configuration=chat_config,
+        metrics_sink=metrics_sink,
+        logger=logger
     )
 
 
@@ -57,4 +81,5 @@ class InferenceBootstrap:
         self.container.config.embedding.from_value(self.configuration.embedding)
         self.container.config.chat.from_value(self.configuration.chat)
         self.container.config.chat_vector_db.from_value(self.configuration.chat.chroma_db)
+        self.container.config.chat_numpy_index.from_value(self.configuration.chat.numpy_index)
         self.container.config.chat_embedding_model.from_value(self.configuration.chat.huggingface_embedding)
\ No newline at end of file
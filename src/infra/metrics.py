@@ -0,0 +1,46 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict
+import numpy as np
+from pydantic import BaseModel
+
+class IMetricsSink(ABC):
+    @abstractmethod
+    def record(self, name: str, value: float):
+        pass
+
+class HistogramSummary(BaseModel):
+    count: int = 0
+    mean: float = 0.0
+    p50: float = 0.0
+    p95: float = 0.0
+    p99: float = 0.0
+
+class InMemoryHistogramSink(IMetricsSink):
+    """Keeps the last max_samples values of every metric and summarizes them with percentiles"""
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self.samples: Dict[str, deque] = {}
+        self.lock = threading.Lock()
+
+    def record(self, name: str, value: float):
+        with self.lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.max_samples)
+            self.samples[name].append(value)
+
+    def get_summary(self, name: str) -> HistogramSummary:
+        with self.lock:
+            values = np.array(self.samples.get(name, []), dtype=np.float64)
+
+        if len(values) == 0:
+            return HistogramSummary()
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return HistogramSummary(count=len(values), mean=float(values.mean()), p50=p50, p95=p95, p99=p99)
+
+    def get_summaries(self) -> Dict[str, HistogramSummary]:
+        with self.lock:
+            names = list(self.samples)
+        return {name: self.get_summary(name) for name in names}
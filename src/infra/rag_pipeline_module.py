@@ -2,10 +2,13 @@ from dependency_injector import  containers, providers
 from dependency_injector.containers import DeclarativeContainer
 import logging
 from src.infra.configuration import ConfigurationManager
-from src.data_access.graphs import Graph, DocumentGraph
-from src.rag.scraping import WebPageScrapper, WebsiteScrapper
-from src.rag.parsing import DocumentParser
+from src.data_access.graphs import Graph, CachedDocumentGraph
+from src.rag.scraping import WebPageScrapper, HtmlWebPageScrapper, PooledWebPageScrapper, WebsiteScrapper
+from src.rag.crawling import WebCrawler
+from src.rag.http_cache import HttpCache
+from src.rag.parsing import DocumentParser, HtmlDocumentParser
 from src.rag.vector_store import ChromaDbVectorStoreRetriever
+from src.rag.numpy_vector_store import NumpyVectorStoreRetriever
 from src.rag.embedding import DocumentEmbedder
 from src.inference.chatbots import OllamaChatClient
 from src.infra.logging_infra import logger
@@ -19,40 +22,77 @@ class DIContainer(DeclarativeContainer):
     neo4j_config = providers.Singleton(config.neo4j)
     neo4j_graph = providers.Singleton(
         Graph,
-        configuration=neo4j_config
+        configuration=neo4j_config,
+        logger=logger
     )
 
     document_graph = providers.Singleton(
-        DocumentGraph,
+        CachedDocumentGraph,
         graph=neo4j_graph
     )
 
     scrapping_config = providers.Singleton(config.scrapping)
-    web_page_scrapper = providers.Singleton(WebPageScrapper)
+    web_page_scrapper = providers.Selector(
+        providers.Callable(lambda configuration: configuration.scrapper_type, scrapping_config),
+        pdf=providers.Singleton(WebPageScrapper),
+        pdf_pool=providers.Singleton(PooledWebPageScrapper, configuration=scrapping_config, logger=logger),
+        html=providers.Singleton(HtmlWebPageScrapper, configuration=scrapping_config)
+    )
+    web_crawler = providers.Singleton(
+        WebCrawler,
+        configuration=scrapping_config,
+        logger=logger
+    )
+    http_cache = providers.Singleton(
+        HttpCache,
+        configuration=scrapping_config,
+        logger=logger
+    )
     web_site_scrapper = providers.Singleton(
         WebsiteScrapper,
         scrapper=web_page_scrapper,
+        crawler=web_crawler,
+        http_cache=http_cache,
         graph=document_graph,
-        configuration=scrapping_config
+        configuration=scrapping_config,
+        logger=logger
     )
 
     parsing_config = providers.Singleton(config.parsing)
-    document_parser = providers.Singleton(
-        DocumentParser,
-        graph=document_graph,
-        configuration=parsing_config
+    document_parser = providers.Selector(
+        providers.Callable(lambda configuration: configuration.parser_type, parsing_config),
+        pdf=providers.Singleton(
+            DocumentParser,
+            graph=document_graph,
+            configuration=parsing_config
+        ),
+        html=providers.Singleton(
+            HtmlDocumentParser,
+            graph=document_graph,
+            configuration=parsing_config
+        )
     )
 
     embedding_vector_db_config = providers.Singleton(config.embedding_vector_db)
+    embedding_numpy_index_config = providers.Singleton(config.embedding_numpy_index)
     embedding_model_config = providers.Singleton(config.embedding_model)
+    embedding_config = providers.Singleton(config.embedding)
 
-    embedding_vector_store_retriever = providers.Singleton(
-        ChromaDbVectorStoreRetriever,
-        chroma_db_config=embedding_vector_db_config,
-        huggingface_embed_config=embedding_model_config,
-        logger=logger
+    embedding_vector_store_retriever = providers.Selector(
+        providers.Callable(lambda configuration: configuration.vector_store, embedding_config),
+        chroma=providers.Singleton(
+            ChromaDbVectorStoreRetriever,
+            chroma_db_config=embedding_vector_db_config,
+            huggingface_embed_config=embedding_model_config,
+            logger=logger
+        ),
+        numpy=providers.Singleton(
+            NumpyVectorStoreRetriever,
+            numpy_index_config=embedding_numpy_index_config,
+            huggingface_embed_config=embedding_model_config,
+            logger=logger
+        )
     )
-    embedding_config = providers.Singleton(config.embedding)
 
     document_embedder = providers.Singleton(
         DocumentEmbedder,
@@ -75,6 +115,7 @@ class RagPipelineBootstrap:
         self.container.config.embedding.from_value(self.configuration.embedding)
         self.container.config.chat.from_value(self.configuration.chat)
         self.container.config.embedding_vector_db.from_value(self.configuration.embedding.chroma_db)
+        self.container.config.embedding_numpy_index.from_value(self.configuration.embedding.numpy_index)
         self.container.config.embedding_model.from_value(self.configuration.embedding.huggingface_embedding)
 
 
@@ -0,0 +1,164 @@
+import re
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple
+from urllib.parse import urljoin, urlparse, urlunparse
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from logging import Logger
+from src.infra.configuration import ScrappingConfiguration
+
+class IUrlFilter(ABC):
+    @abstractmethod
+    def apply(self, url: str) -> bool:
+        pass
+
+def normalize_url(url: str, keep_query: bool = False) -> Optional[str]:
+    """
+    Normalizes an absolute URL: lower cases the scheme and host, removes default ports, duplicate slashes,
+    fragments and (unless keep_query is set) the query string. Returns None for non http(s) URLs.
+    """
+    try:
+        parsed = urlparse(url.strip())
+        port = parsed.port
+    except ValueError:
+        return None
+
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    if scheme not in ('http', 'https') or not host:
+        return None
+
+    default_port = 80 if scheme == 'http' else 443
+    netloc = host if port is None or port == default_port else f'{host}:{port}'
+    path = re.sub(r'/{2,}', '/', parsed.path) or '/'
+    query = parsed.query if keep_query else ''
+
+    return urlunparse((scheme, netloc, path, '', query, ''))
+
+def extract_links(html: str, base_url: str) -> List[str]:
+    """Extracts all anchor hrefs from the html resolved against the page url"""
+    soup = BeautifulSoup(html, "html.parser")
+    base_tag = soup.find("base", href=True)
+    if base_tag:
+        base_url = urljoin(base_url, base_tag["href"])
+
+    return [urljoin(base_url, a["href"]) for a in soup.find_all("a", href=True)]
+
+class UrlFrontier:
+    """Breadth first queue of urls which hands out every url only once"""
+
+    def __init__(self):
+        self.queue = deque()
+        self.seen = set()
+
+    @staticmethod
+    def key(url: str) -> str:
+        # Trailing slash variants of a path point to the same page
+        parsed = urlparse(url)
+        return urlunparse(parsed._replace(path=parsed.path.rstrip('/') or '/'))
+
+    def is_seen(self, url: str) -> bool:
+        return self.key(url) in self.seen
+
+    def mark_seen(self, url: str):
+        self.seen.add(self.key(url))
+
+    def push(self, url: str, depth: int) -> bool:
+        if self.is_seen(url):
+            return False
+
+        self.mark_seen(url)
+        self.queue.append((url, depth))
+        return True
+
+    def pop_level(self) -> List[Tuple[str, int]]:
+        """Pops all the queued urls of the shallowest depth"""
+        if not self.queue:
+            return []
+
+        depth = self.queue[0][1]
+        level = []
+        while self.queue and self.queue[0][1] == depth:
+            level.append(self.queue.popleft())
+        return level
+
+    def __len__(self):
+        return len(self.queue)
+
+class IWebCrawler(ABC):
+    @abstractmethod
+    def crawl(self, url: str, url_filter: IUrlFilter = None, max_depth: int = None) -> List[str]:
+        pass
+
+class WebCrawler(IWebCrawler):
+    def __init__(self, configuration: ScrappingConfiguration, logger: Logger):
+        self.configuration = configuration
+        self.logger = logger
+
+        pool_size = max(1, configuration.max_concurrency)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def crawl(self, url: str, url_filter: IUrlFilter = None, max_depth: int = None) -> List[str]:
+        """
+        Crawls the site breadth first up to max_depth link hops from the url and returns the discovered urls.
+        Urls rejected by the filter are never enqueued, hence never fetched, and only pages of the
+        start url host are fetched.
+        """
+        max_depth = self.configuration.crawl_depth if max_depth is None else max_depth
+        keep_query = self.configuration.crawl_keep_query
+        start_url = normalize_url(url, keep_query=keep_query)
+        if start_url is None:
+            raise ValueError(f'Unable to crawl {url}. Only absolute http(s) urls are supported')
+
+        start_host = urlparse(start_url).netloc
+        frontier = UrlFrontier()
+        frontier.push(start_url, 0)
+        discovered = []
+
+        max_workers = max(1, self.configuration.max_concurrency)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='crawler') as executor:
+            while frontier:
+                level = [
+                    (page_url, depth) for page_url, depth in frontier.pop_level()
+                    if depth < max_depth and urlparse(page_url).netloc == start_host
+                ]
+                pages_links = executor.map(lambda item: self.fetch_links(item[0]), level)
+
+                for (page_url, depth), links in zip(level, pages_links):
+                    for link in links:
+                        normalized_link = normalize_url(link, keep_query=keep_query)
+                        if normalized_link is None or frontier.is_seen(normalized_link):
+                            continue
+
+                        if url_filter and url_filter.apply(normalized_link):
+                            self.logger.debug(f'Skipping the {normalized_link} link')
+                            frontier.mark_seen(normalized_link)
+                            continue
+
+                        frontier.push(normalized_link, depth + 1)
+                        discovered.append(normalized_link)
+
+                    self.logger.debug(f'Crawled {page_url} (depth {depth}), {len(discovered)} urls discovered')
+
+        self.logger.info(f'Crawling of {start_url} discovered {len(discovered)} urls')
+        return discovered
+
+    def fetch_links(self, url: str) -> List[str]:
+        try:
+            response = self.session.get(url, timeout=self.configuration.request_timeout_seconds)
+        except requests.RequestException as e:
+            self.logger.warning(f'Unable to fetch {url}: {e}')
+            return []
+
+        content_type = response.headers.get('Content-Type', '')
+        if not response.ok or 'html' not in content_type:
+            self.logger.debug(f'Not following {url} (status {response.status_code}, {content_type})')
+            return []
+
+        return extract_links(html=response.text, base_url=response.url)
@@ -1,8 +1,11 @@
+import re
+import time
 from pydantic import BaseModel
 from abc import ABC, abstractmethod
+from typing import List, Dict, Tuple
 from src.infra.configuration import EmbeddingConfiguration
-from src.data_access.graphs import DocumentGraph
-from src.rag.vector_store import IVectorStoreRetriever
+from src.data_access.graphs import DocumentGraph, DocumentNode
+from src.rag.vector_store import IVectorStoreRetriever, DocumentChunk
 from pathlib import Path
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from logging import Logger
@@ -10,11 +13,46 @@ from logging import Logger
 class EmbeddingRequest(BaseModel):
     document_id: str
 
+class EmbeddingSummary(BaseModel):
+    documents: int = 0
+    failed: int = 0
+    errors: Dict[str, str] = {}
+    chunks: int = 0
+    added: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    batches: int = 0
+    load_seconds: float = 0.0
+    split_seconds: float = 0.0
+    embed_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+    chunks_per_second: float = 0.0
+
+def find_headings(md_content: str) -> List[Tuple[int, int, str]]:
+    """Returns the position, level and title of the Markdown headings, skipping fenced code blocks"""
+    headings = []
+    position = 0
+    in_code_block = False
+    for line in md_content.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith('```'):
+            in_code_block = not in_code_block
+        elif not in_code_block:
+            match = re.match(r'^(#{1,6})\s+(.+?)\s*#*$', stripped)
+            if match:
+                headings.append((position, len(match.group(1)), match.group(2).replace('**', '').strip()))
+        position += len(line)
+    return headings
+
 class IEmbedder(ABC):
     @abstractmethod
     def embed(self, request: EmbeddingRequest):
         pass
 
+    @abstractmethod
+    def embed_many(self, requests: List[EmbeddingRequest]) -> EmbeddingSummary:
+        pass
+
 class DocumentEmbedder(IEmbedder):
     def __init__(
             self,
@@ -27,8 +65,14 @@ class DocumentEmbedder(IEmbedder):
         self.configuration = configuration
         self.vector_store_retriever = vector_store_retriever
         self.logger = logger
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.configuration.chunk_size,
+            chunk_overlap=self.configuration.chunk_overlap,
+            separators=["\n## ", "\n### ", "\n", " "],
+            add_start_index=True
+        )
 
-    def embed(self, request: EmbeddingRequest):
+    def load(self, request: EmbeddingRequest) -> Tuple[DocumentNode, str]:
         document_id = request.document_id
         document_node = self.graph.get_document_node_by_id(document_id=document_id)
 
@@ -47,15 +91,130 @@ class DocumentEmbedder(IEmbedder):
                             'Parsed document was not found')
 
         with open(parsed_file_path, "r", encoding="utf-8") as file:
-            md_content = file.read()
+            return document_node, file.read()
 
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.configuration.chunk_size,
-            chunk_overlap=self.configuration.chunk_overlap,
-            separators=["\n## ", "\n### ", "\n", " "]
-        )
+    def split(self, document_node: DocumentNode, md_content: str) -> List[DocumentChunk]:
+        """Splits the document to chunks carrying the document, site, url and heading path metadata"""
+        document_metadata = {
+            'site_name': document_node.site_name,
+            'url': document_node.url
+        }
+        document_metadata = {key: value for key, value in document_metadata.items() if value is not None}
+
+        headings = find_headings(md_content)
+        heading_stack = []
+        next_heading = 0
+        chunks = []
+        for ordinal, split_document in enumerate(self.splitter.create_documents([md_content])):
+            text = split_document.page_content
+            # Headings the chunk starts with belong to its path
+            start_index = split_document.metadata['start_index'] + len(text) - len(text.lstrip())
+            while next_heading < len(headings) and headings[next_heading][0] <= start_index:
+                _, level, title = headings[next_heading]
+                heading_stack = [heading for heading in heading_stack if heading[0] < level] + [(level, title)]
+                next_heading += 1
+
+            metadata = dict(document_metadata)
+            if heading_stack:
+                metadata['heading_path'] = ' > '.join(title for _, title in heading_stack)
+
+            chunks.append(DocumentChunk(
+                document_id=document_node.id,
+                ordinal=ordinal,
+                text=text,
+                metadata=metadata
+            ))
+        return chunks
+
+    def embed(self, request: EmbeddingRequest):
+        document_node, md_content = self.load(request=request)
+        chunks = self.split(document_node=document_node, md_content=md_content)
+
+        self.logger.info(f'Embedding chunks for {request.document_id} document')
+        self.vector_store_retriever.upsert(chunks=chunks, document_ids=[request.document_id])
+
+    def embed_many(self, requests: List[EmbeddingRequest]) -> EmbeddingSummary:
+        """
+        Embeds the chunks of many documents together, upserting them to the vector store in batches of about
+        batch_size chunks instead of a few chunks per document. A failing document is reported in the summary,
+        and when the upsert of a batch fails its documents are upserted one by one, so only the failing ones
+        are left out.
+        """
+        summary = EmbeddingSummary()
+        pending_chunks = []
+        pending_document_ids = []
+        started_at = time.perf_counter()
+
+        for request in requests:
+            try:
+                loading_started_at = time.perf_counter()
+                document_node, md_content = self.load(request=request)
+                splitting_started_at = time.perf_counter()
+                chunks = self.split(document_node=document_node, md_content=md_content)
+                summary.load_seconds += splitting_started_at - loading_started_at
+                summary.split_seconds += time.perf_counter() - splitting_started_at
+            except Exception as e:
+                summary.failed += 1
+                summary.errors[request.document_id] = str(e)
+                self.logger.error(f'Unable to embed {request.document_id} document: {e}')
+                continue
+
+            # Batches always hold whole documents, so the upsert sees all the chunks of a document at once
+            summary.documents += 1
+            pending_chunks.extend(chunks)
+            pending_document_ids.append(request.document_id)
+            if len(pending_chunks) >= self.configuration.batch_size:
+                self.__flush(chunks=pending_chunks, document_ids=pending_document_ids, summary=summary)
+                pending_chunks = []
+                pending_document_ids = []
+
+        if pending_document_ids:
+            self.__flush(chunks=pending_chunks, document_ids=pending_document_ids, summary=summary)
+
+        summary.elapsed_seconds = time.perf_counter() - started_at
+        if summary.elapsed_seconds > 0:
+            summary.chunks_per_second = summary.chunks / summary.elapsed_seconds
+
+        self.logger.info(f'Embedded {summary.chunks} chunks of {summary.documents} documents '
+                         f'({summary.failed} failed) in {summary.batches} batches, {summary.added} added, '
+                         f'{summary.deleted} deleted, {summary.unchanged} unchanged, '
+                         f'{summary.chunks_per_second:.1f} chunks/sec. load {summary.load_seconds:.1f}s, '
+                         f'split {summary.split_seconds:.1f}s, embed {summary.embed_seconds:.1f}s')
+        return summary
+
+    def __flush(self, chunks: List[DocumentChunk], document_ids: List[str], summary: EmbeddingSummary):
+        try:
+            self.__upsert(chunks=chunks, document_ids=document_ids, summary=summary)
+            return
+        except Exception as e:
+            if len(document_ids) == 1:
+                self.__fail(document_id=document_ids[0], error=e, summary=summary)
+                return
+            self.logger.warning(f'Unable to embed a batch of {len(document_ids)} documents, '
+                                f'embedding them one by one: {e}')
+
+        for document_id in document_ids:
+            document_chunks = [chunk for chunk in chunks if chunk.document_id == document_id]
+            try:
+                self.__upsert(chunks=document_chunks, document_ids=[document_id], summary=summary)
+            except Exception as e:
+                self.__fail(document_id=document_id, error=e, summary=summary)
 
-        chunks = splitter.split_text(md_content)
+    def __upsert(self, chunks: List[DocumentChunk], document_ids: List[str], summary: EmbeddingSummary):
+        embedding_started_at = time.perf_counter()
+        try:
+            result = self.vector_store_retriever.upsert(chunks=chunks, document_ids=document_ids)
+        finally:
+            summary.embed_seconds += time.perf_counter() - embedding_started_at
+        summary.chunks += len(chunks)
+        summary.added += result.added
+        summary.deleted += result.deleted
+        summary.unchanged += result.unchanged
+        summary.batches += 1
+        self.logger.info(f'Embedded a batch of {len(chunks)} chunks, {summary.chunks} chunks so far')
 
-        self.logger.info(f'Embedding chunks for {parsed_file_path} file')
-        self.vector_store_retriever.embed(chunks=chunks)
\ No newline at end of file
+    def __fail(self, document_id: str, error: Exception, summary: EmbeddingSummary):
+        summary.documents -= 1
+        summary.failed += 1
+        summary.errors[document_id] = str(error)
+        self.logger.error(f'Unable to embed {document_id} document: {error}')
@@ -0,0 +1,87 @@
+from pathlib import Path
+from typing import Tuple
+from huggingface_hub import snapshot_download
+from huggingface_hub.utils import LocalEntryNotFoundError
+from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+from src.infra.configuration import HuggingFaceEmbeddingConfiguration
+from logging import Logger
+
+BACKENDS = ['torch', 'onnx']
+
+def get_embedding_model_key(huggingface_embed_config: HuggingFaceEmbeddingConfiguration) -> str:
+    """Identifies the model and runtime, embeddings of different runtimes differ slightly and are cached apart"""
+    if huggingface_embed_config.backend == 'torch':
+        return huggingface_embed_config.model_name
+    return f'{huggingface_embed_config.model_name}:{huggingface_embed_config.backend}:' \
+           f'{huggingface_embed_config.onnx_quantization or "float32"}'
+
+def get_onnx_file_name(huggingface_embed_config: HuggingFaceEmbeddingConfiguration) -> str:
+    quantization = huggingface_embed_config.onnx_quantization
+    return f'onnx/model_qint8_{quantization}.onnx' if quantization else 'onnx/model.onnx'
+
+def ensure_model_is_local(huggingface_embed_config: HuggingFaceEmbeddingConfiguration):
+    """Raises when local_files_only is set and the model was never downloaded to the persist directory"""
+    model_name = huggingface_embed_config.model_name
+    if not huggingface_embed_config.local_files_only or Path(model_name).is_dir():
+        return
+
+    try:
+        snapshot_download(repo_id=model_name, cache_dir=huggingface_embed_config.persist_directory,
+                          local_files_only=True)
+    except LocalEntryNotFoundError:
+        raise ValueError(f'Embedding model {model_name} was not found in {huggingface_embed_config.persist_directory}. '
+                         f'Download it first, e.g. huggingface-cli download {model_name} --cache-dir '
+                         f'{huggingface_embed_config.persist_directory}, or set local_files_only to false to let '
+                         f'the embedding model download it.')
+
+def export_onnx_model(huggingface_embed_config: HuggingFaceEmbeddingConfiguration, logger: Logger) -> Path:
+    """
+    Exports the model to ONNX under <persist_directory>/onnx/<model name>, quantizing it with dynamic int8
+    quantization when onnx_quantization names a target (arm64, avx2, avx512 or avx512_vnni). The export runs
+    once, later loads read the exported files only.
+    """
+    model_name = huggingface_embed_config.model_name
+    onnx_directory = Path(huggingface_embed_config.persist_directory).joinpath('onnx', model_name.replace('/', '__'))
+    file_name = get_onnx_file_name(huggingface_embed_config)
+    if onnx_directory.joinpath(file_name).exists():
+        return onnx_directory
+
+    logger.info(f'Exporting {model_name} embedding model to ONNX in {onnx_directory}.')
+    model = SentenceTransformer(
+        model_name,
+        device='cpu',
+        backend='onnx',
+        cache_folder=huggingface_embed_config.persist_directory,
+        local_files_only=huggingface_embed_config.local_files_only
+    )
+    model.save(str(onnx_directory))
+
+    if huggingface_embed_config.onnx_quantization:
+        export_dynamic_quantized_onnx_model(
+            model,
+            quantization_config=huggingface_embed_config.onnx_quantization,
+            model_name_or_path=str(onnx_directory)
+        )
+    logger.info(f'Embedding model was exported to {onnx_directory.joinpath(file_name)}.')
+    return onnx_directory
+
+def resolve_embedding_model(huggingface_embed_config: HuggingFaceEmbeddingConfiguration,
+                            logger: Logger) -> Tuple[str, dict]:
+    """Returns the model name or path and the SentenceTransformer arguments of the configured backend"""
+    if huggingface_embed_config.backend not in BACKENDS:
+        raise ValueError(f'Unsupported embedding backend {huggingface_embed_config.backend}, expected one of {BACKENDS}')
+    ensure_model_is_local(huggingface_embed_config=huggingface_embed_config)
+
+    if huggingface_embed_config.backend == 'torch':
+        return huggingface_embed_config.model_name, {
+            'device': 'cpu',
+            'local_files_only': huggingface_embed_config.local_files_only
+        }
+
+    onnx_directory = export_onnx_model(huggingface_embed_config=huggingface_embed_config, logger=logger)
+    return str(onnx_directory), {
+        'device': 'cpu',
+        'backend': 'onnx',
+        'model_kwargs': {'file_name': get_onnx_file_name(huggingface_embed_config)},
+        'local_files_only': True
+    }
@@ -0,0 +1,218 @@
+import re
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Callable
+import numpy as np
+from pydantic import BaseModel
+from langchain_core.embeddings import Embeddings
+from logging import Logger
+
+class EmbeddingCacheStatistics(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content addressed cache of document embeddings persisted in SQLite. Entries are keyed by a hash of the
+    model name and the chunk text, stored as float32 and evicted least recently used first once the cache
+    outgrows max_size_bytes. Query embeddings are not cached.
+    """
+
+    # SQLite limits the number of host parameters of a statement
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache_path: str, max_size_bytes: int, logger: Logger):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_size_bytes = max_size_bytes
+        self.logger = logger
+        self.statistics = EmbeddingCacheStatistics()
+
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """)
+        self.connection.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+        self.connection.commit()
+
+        self.__count_entries()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f'{self.model_name}\0{text}'.encode('utf-8')).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(text) for text in texts]
+        vectors = self.__get_many(list(set(keys)))
+
+        missing_texts = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing_texts[key] = text
+
+        with self.lock:
+            self.statistics.hits += len(texts) - len(missing_texts)
+            self.statistics.misses += len(missing_texts)
+
+        if missing_texts:
+            embeddings = self.embeddings.embed_documents(list(missing_texts.values()))
+            new_vectors = dict(zip(missing_texts.keys(), embeddings))
+            self.__put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        self.logger.debug(f'Embedding cache: {len(texts) - len(missing_texts)}/{len(texts)} chunks found, '
+                          f'hit rate {self.statistics.hit_rate:.1%}')
+        return [list(vectors[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def get_statistics(self) -> EmbeddingCacheStatistics:
+        with self.lock:
+            return self.statistics.model_copy()
+
+    def __get_many(self, keys: List[str]) -> dict:
+        vectors = {}
+        now = time.time()
+        with self.lock:
+            for start in range(0, len(keys), self.LOOKUP_BATCH_SIZE):
+                batch = keys[start:start + self.LOOKUP_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.connection.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                for key, vector in rows:
+                    vectors[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+                self.connection.execute(
+                    f'UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})', [now, *batch]
+                )
+            self.connection.commit()
+        return vectors
+
+    def __put_many(self, vectors: dict):
+        now = time.time()
+        rows = []
+        for key, vector in vectors.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)', rows
+            )
+            self.connection.commit()
+            # Replaced keys, e.g. cached meanwhile by another process, must not be counted twice
+            self.__count_entries()
+            self.__evict()
+
+    def __count_entries(self):
+        entries, size_bytes = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings').fetchone()
+        self.statistics.entries = entries
+        self.statistics.size_bytes = size_bytes
+
+    def __evict(self):
+        if self.statistics.size_bytes <= self.max_size_bytes:
+            return
+
+        # Evict down to 90% of the limit, so eviction does not run on every insert
+        target_size = int(self.max_size_bytes * 0.9)
+        rows = self.connection.execute('SELECT key, size FROM embeddings ORDER BY last_used').fetchall()
+        evicted_keys = []
+        for key, size in rows:
+            if self.statistics.size_bytes <= target_size:
+                break
+            evicted_keys.append((key,))
+            self.statistics.size_bytes -= size
+
+        self.connection.executemany('DELETE FROM embeddings WHERE key = ?', evicted_keys)
+        self.connection.commit()
+        self.statistics.entries -= len(evicted_keys)
+        self.statistics.evictions += len(evicted_keys)
+        self.logger.info(f'Embedding cache evicted {len(evicted_keys)} entries')
+
+class QueryEmbeddingCacheStatistics(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    expirations: int = 0
+    evictions: int = 0
+    entries: int = 0
+    encode_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def mean_encode_milliseconds(self) -> float:
+        return self.encode_seconds * 1000 / self.misses if self.misses else 0.0
+
+def normalize_query(text: str) -> str:
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+class QueryEmbeddingCache:
+    """
+    In memory LRU of query embeddings keyed by the normalized query text, entries expire after ttl_seconds.
+    A max_size of 0 disables caching, the encode time is measured either way.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.statistics = QueryEmbeddingCacheStatistics()
+
+    def get_or_embed(self, text: str, embed: Callable[[str], List[float]]) -> List[float]:
+        key = normalize_query(text)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                vector, expires_at = entry
+                if expires_at > now:
+                    self.entries.move_to_end(key)
+                    self.statistics.hits += 1
+                    return vector
+                del self.entries[key]
+                self.statistics.expirations += 1
+
+        started_at = time.perf_counter()
+        vector = embed(key)
+        encode_seconds = time.perf_counter() - started_at
+
+        with self.lock:
+            self.statistics.misses += 1
+            self.statistics.encode_seconds += encode_seconds
+            if self.max_size > 0:
+                self.entries[key] = (vector, now + self.ttl_seconds)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+                    self.statistics.evictions += 1
+            self.statistics.entries = len(self.entries)
+        return vector
+
+    def get_statistics(self) -> QueryEmbeddingCacheStatistics:
+        with self.lock:
+            return self.statistics.model_copy()
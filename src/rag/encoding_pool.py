@@ -0,0 +1,92 @@
+import os
+import atexit
+import threading
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+from src.infra.configuration import HuggingFaceEmbeddingConfiguration
+from src.rag.embedding_backends import resolve_embedding_model
+from logging import Logger
+
+INTRA_OP_THREADS_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']
+
+class MultiProcessEmbeddings(Embeddings):
+    """
+    Sentence transformer embeddings encoded by a pool of worker processes. Large lists of documents are sharded
+    across the workers and reassembled in their original order, small lists and queries are encoded in process.
+    The pool is started on first use, kept for the lifetime of the process and stopped on exit.
+    """
+
+    def __init__(self, huggingface_embed_config: HuggingFaceEmbeddingConfiguration, logger: Logger):
+        self.configuration = huggingface_embed_config
+        self.logger = logger
+        model_name_or_path, model_kwargs = resolve_embedding_model(
+            huggingface_embed_config=huggingface_embed_config,
+            logger=logger
+        )
+        self.model = SentenceTransformer(
+            model_name_or_path,
+            cache_folder=huggingface_embed_config.persist_directory,
+            **model_kwargs
+        )
+        self.pool: Optional[dict] = None
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) < self.configuration.multi_process_min_chunks:
+            return self.__encode(texts)
+
+        embeddings = self.model.encode_multi_process(
+            texts,
+            pool=self.__get_pool(),
+            batch_size=self.configuration.encode_batch_size,
+            chunk_size=self.__shard_size(len(texts))
+        )
+        return embeddings.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.__encode([text])[0]
+
+    def close(self):
+        with self.lock:
+            if self.pool is None:
+                return
+            SentenceTransformer.stop_multi_process_pool(self.pool)
+            self.pool = None
+            self.logger.info('Stopped the embedding encode pool')
+
+    def __encode(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.model.encode(texts, batch_size=self.configuration.encode_batch_size,
+                                       normalize_embeddings=False)
+        return embeddings.tolist()
+
+    def __shard_size(self, texts: int) -> int:
+        # A few shards per worker keeps the workers busy until the end, while each shard fills several batches
+        shards = self.configuration.encode_processes * 4
+        return max(self.configuration.encode_batch_size, -(-texts // shards))
+
+    def __get_pool(self) -> dict:
+        with self.lock:
+            if self.pool is not None:
+                return self.pool
+
+            # Workers are spawned processes, they read the thread counts from the environment when importing torch
+            previous_values = {variable: os.environ.get(variable) for variable in INTRA_OP_THREADS_VARIABLES}
+            if self.configuration.intra_op_threads:
+                for variable in INTRA_OP_THREADS_VARIABLES:
+                    os.environ[variable] = str(self.configuration.intra_op_threads)
+            try:
+                self.pool = self.model.start_multi_process_pool(
+                    target_devices=['cpu'] * self.configuration.encode_processes
+                )
+            finally:
+                for variable, value in previous_values.items():
+                    if value is None:
+                        os.environ.pop(variable, None)
+                    else:
+                        os.environ[variable] = value
+
+            self.logger.info(f'Started the embedding encode pool with {self.configuration.encode_processes} '
+                             f'processes, {self.configuration.intra_op_threads or "default"} threads each')
+            return self.pool
@@ -0,0 +1,152 @@
+import re
+from bs4 import BeautifulSoup, NavigableString, Comment, Tag
+
+BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'template', 'nav', 'footer', 'header', 'aside', 'form',
+                    'button', 'svg', 'iframe', 'img', 'picture', 'video', 'audio']
+BOILERPLATE_ROLES = ['navigation', 'banner', 'contentinfo', 'search', 'complementary']
+BOILERPLATE_CLASSES = ['headerlink', 'linenos', 'md-sidebar', 'md-footer', 'md-header', 'md-source-file']
+CONTENT_SELECTORS = ['main article', 'article', 'main', '[role=main]', 'body']
+
+HEADINGS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5, 'h6': 6}
+BLOCK_TAGS = {'p', 'div', 'section', 'article', 'main', 'body', 'html', 'pre', 'ul', 'ol', 'li', 'table',
+              'blockquote', 'dl', 'dt', 'dd', 'figure', 'figcaption', 'details', 'summary', 'hr', *HEADINGS}
+
+def html_to_markdown(html: str) -> str:
+    """
+    Converts the main content of an html page to Markdown. Headings, code blocks, lists and tables are kept,
+    while navigation, headers, footers and other page boilerplate are removed.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    root = None
+    for selector in CONTENT_SELECTORS:
+        root = soup.select_one(selector)
+        if root:
+            break
+    root = root or soup
+
+    for comment in root.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    for tag in root.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in root.select(','.join(f'[role={role}]' for role in BOILERPLATE_ROLES)):
+        tag.decompose()
+    for tag in root.select(','.join(f'.{css_class}' for css_class in BOILERPLATE_CLASSES)):
+        tag.decompose()
+
+    markdown = _render_block(root)
+    return _clean_up(markdown)
+
+def _render_block(node: Tag) -> str:
+    name = node.name
+    if name in HEADINGS:
+        return f'\n\n{"#" * HEADINGS[name]} {_render_inline(node).strip()}\n\n'
+    if name == 'pre':
+        return _render_code_block(node)
+    if name in ('ul', 'ol'):
+        return _render_list(node)
+    if name == 'table':
+        return _render_table(node)
+    if name == 'blockquote':
+        content = _clean_up(_render_children(node))
+        return '\n\n' + '\n'.join(f'> {line}' if line else '>' for line in content.split('\n')) + '\n\n'
+    if name == 'hr':
+        return '\n\n---\n\n'
+
+    content = _render_children(node)
+    if name in BLOCK_TAGS:
+        return f'\n\n{content}\n\n'
+    return content
+
+def _render_children(node: Tag) -> str:
+    parts = []
+    for child in node.children:
+        if isinstance(child, NavigableString):
+            parts.append(re.sub(r'\s+', ' ', str(child)))
+        elif isinstance(child, Tag):
+            if child.name in BLOCK_TAGS:
+                parts.append(_render_block(child))
+            else:
+                parts.append(_render_inline_tag(child))
+    return ''.join(parts)
+
+def _render_inline(node: Tag) -> str:
+    return _render_children(node)
+
+def _render_inline_tag(node: Tag) -> str:
+    name = node.name
+    if name == 'br':
+        return '\n'
+    if name == 'code':
+        text = node.get_text()
+        return f'`{text}`' if text.strip() else ''
+
+    content = _render_children(node)
+    if not content.strip():
+        return content
+    if name in ('strong', 'b'):
+        return f'**{content.strip()}**'
+    if name in ('em', 'i'):
+        return f'*{content.strip()}*'
+    return content
+
+def _render_code_block(node: Tag) -> str:
+    code = node.find('code') or node
+    language = ''
+    for css_class in (code.get('class') or []) + (node.get('class') or []):
+        if css_class.startswith('language-'):
+            language = css_class[len('language-'):]
+            break
+
+    text = code.get_text().strip('\n')
+    return f'\n\n```{language}\n{text}\n```\n\n'
+
+def _render_list(node: Tag) -> str:
+    ordered = node.name == 'ol'
+    lines = []
+    for index, item in enumerate(node.find_all('li', recursive=False), start=1):
+        marker = f'{index}. ' if ordered else '- '
+        content = _clean_up(_render_children(item))
+        item_lines = content.split('\n') if content else ['']
+        lines.append(marker + item_lines[0])
+        lines.extend(('  ' + line) if line else '' for line in item_lines[1:])
+    return '\n\n' + '\n'.join(lines) + '\n\n'
+
+def _render_table(node: Tag) -> str:
+    rows = []
+    for row in node.find_all('tr'):
+        cells = [' '.join(_render_inline(cell).split()).replace('|', '\\|') for cell in row.find_all(['th', 'td'])]
+        if cells:
+            rows.append(cells)
+    if not rows:
+        return ''
+
+    width = max(len(cells) for cells in rows)
+    lines = []
+    for index, cells in enumerate(rows):
+        cells = cells + [''] * (width - len(cells))
+        lines.append('| ' + ' | '.join(cells) + ' |')
+        if index == 0:
+            lines.append('|' + ' --- |' * width)
+    return '\n\n' + '\n'.join(lines) + '\n\n'
+
+def _clean_up(markdown: str) -> str:
+    """Trims the whitespace left around blocks, keeping code blocks and list indentation untouched"""
+    lines = []
+    in_code_block = False
+    for line in markdown.split('\n'):
+        if line.lstrip().startswith('```'):
+            in_code_block = not in_code_block
+            lines.append(line.strip() if not line.startswith('  ') else line.rstrip())
+            continue
+        if in_code_block:
+            lines.append(line)
+            continue
+
+        stripped = line.strip()
+        indentation = len(line) - len(line.lstrip())
+        if re.match(r'^([-*]|\d+\.)\s', stripped) or (indentation >= 2 and lines and lines[-1].strip()):
+            lines.append(' ' * (indentation // 2 * 2) + stripped)
+        else:
+            lines.append(stripped)
+
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
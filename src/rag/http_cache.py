@@ -0,0 +1,99 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from pydantic import BaseModel
+from logging import Logger
+from src.infra.configuration import ScrappingConfiguration
+
+class HttpCacheEntry(BaseModel):
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+
+class RevalidationResult(BaseModel):
+    url: str
+    is_changed: bool
+    status_code: int
+    entry: HttpCacheEntry
+
+class HttpCache:
+    """
+    Persistent cache of the HTTP validators (ETag, Last-Modified) and content hashes of the scrapped pages,
+    used to detect with a conditional request whether a page changed since it was last scrapped.
+    """
+
+    def __init__(self, configuration: ScrappingConfiguration, logger: Logger):
+        self.configuration = configuration
+        self.logger = logger
+
+        cache_path = Path(configuration.storage_path).joinpath('http_cache.sqlite3')
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(cache_path), check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT
+            )
+            """)
+        self.connection.commit()
+
+        pool_size = max(1, configuration.max_concurrency)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url: str) -> HttpCacheEntry | None:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT url, etag, last_modified, content_hash FROM http_cache WHERE url = ?', (url,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return HttpCacheEntry(url=row[0], etag=row[1], last_modified=row[2], content_hash=row[3])
+
+    def store(self, entry: HttpCacheEntry):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO http_cache (url, etag, last_modified, content_hash) VALUES (?, ?, ?, ?)',
+                (entry.url, entry.etag, entry.last_modified, entry.content_hash)
+            )
+            self.connection.commit()
+
+    def revalidate(self, url: str) -> RevalidationResult:
+        """
+        Sends a conditional request for the url. The page is unchanged when the server answers 304 or the
+        content hash equals the cached one. The returned entry should be stored once the page was processed.
+        """
+        cached_entry = self.get(url)
+        headers = {}
+        if cached_entry and cached_entry.etag:
+            headers['If-None-Match'] = cached_entry.etag
+        if cached_entry and cached_entry.last_modified:
+            headers['If-Modified-Since'] = cached_entry.last_modified
+
+        response = self.session.get(url, headers=headers, timeout=self.configuration.request_timeout_seconds)
+
+        if response.status_code == 304 and cached_entry:
+            return RevalidationResult(url=url, is_changed=False, status_code=304, entry=cached_entry)
+
+        response.raise_for_status()
+        entry = HttpCacheEntry(
+            url=url,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            content_hash=hashlib.sha256(response.content).hexdigest()
+        )
+        is_changed = cached_entry is None or cached_entry.content_hash != entry.content_hash
+
+        return RevalidationResult(url=url, is_changed=is_changed, status_code=response.status_code, entry=entry)
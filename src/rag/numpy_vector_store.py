@@ -0,0 +1,626 @@
+import os
+import json
+import sqlite3
+import uuid
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Set
+import numpy as np
+from langchain_core.documents import Document
+from src.infra.configuration import NumpyIndexConfiguration, HuggingFaceEmbeddingConfiguration
+from src.rag.quantization import VectorQuantizer
+from src.rag.vector_store import (IVectorStoreRetriever, DocumentChunk, UpsertResult, content_hash,
+                                  create_embedding_model)
+from src.rag.embedding_cache import QueryEmbeddingCache, QueryEmbeddingCacheStatistics
+from logging import Logger
+
+FILTER_OPERATORS = {
+    '$eq': lambda value, operand: value == operand,
+    '$ne': lambda value, operand: value != operand,
+    '$in': lambda value, operand: value in operand,
+    '$nin': lambda value, operand: value not in operand,
+    '$gt': lambda value, operand: value is not None and value > operand,
+    '$gte': lambda value, operand: value is not None and value >= operand,
+    '$lt': lambda value, operand: value is not None and value < operand,
+    '$lte': lambda value, operand: value is not None and value <= operand,
+}
+
+SQL_OPERATORS = {
+    '$eq': 'IS',
+    '$ne': 'IS NOT',
+    '$gt': '>',
+    '$gte': '>=',
+    '$lt': '<',
+    '$lte': '<=',
+}
+
+def matches_filter(metadata: dict, metadata_filter: dict) -> bool:
+    """Evaluates a Chroma style where filter, e.g. {'$and': [{'site_name': 'x'}, {'url': {'$in': [...]}}]}"""
+    for key, condition in metadata_filter.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator not in FILTER_OPERATORS:
+                    raise ValueError(f'Unsupported metadata filter operator {operator}')
+                if not FILTER_OPERATORS[operator](value, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def filter_to_sql(metadata_filter: dict) -> tuple:
+    """Translates a Chroma style where filter to a SQL condition on the JSON metadata, see matches_filter"""
+    clauses = []
+    parameters = []
+    for key, condition in metadata_filter.items():
+        if key in ('$and', '$or'):
+            sub_clauses = []
+            for sub_filter in condition:
+                sub_clause, sub_parameters = filter_to_sql(sub_filter)
+                sub_clauses.append(f'({sub_clause})')
+                parameters.extend(sub_parameters)
+            empty = '1' if key == '$and' else '0'
+            clauses.append((' AND ' if key == '$and' else ' OR ').join(sub_clauses) or empty)
+            continue
+
+        value = 'json_extract(metadata, ?)'
+        path = '$.' + json.dumps(key)
+        operators = condition if isinstance(condition, dict) else {'$eq': condition}
+        for operator, operand in operators.items():
+            if operator in ('$in', '$nin'):
+                operand = list(operand)
+                placeholders = ','.join('?' * len(operand))
+                if operator == '$in':
+                    clauses.append(f'{value} IN ({placeholders})' if operand else '0')
+                else:
+                    clauses.append(f'({value} IS NULL OR {value} NOT IN ({placeholders}))' if operand else '1')
+                parameters.extend([path] * (1 if operator == '$in' else 2) + operand if operand else [])
+            elif operator in SQL_OPERATORS:
+                clauses.append(f'{value} {SQL_OPERATORS[operator]} ?')
+                parameters.extend([path, operand])
+            else:
+                raise ValueError(f'Unsupported metadata filter operator {operator}')
+    return ' AND '.join(clauses) or '1', parameters
+
+class NumpyVectorIndex:
+    """
+    Flat index of normalized float32 embeddings kept in a memory mapped matrix (vectors.f32), with the row ids,
+    texts, metadata and tombstones in a SQLite database (index.sqlite3). Rows are appended to both and a save
+    commits them with a new version number after the matrix is flushed, so saving costs the size of the batch
+    rather than of the index, and readers in other processes always see a consistent set of rows. Opening the
+    index reads the state and the tombstones only: texts and metadata stay in SQLite, where filters are
+    evaluated and the chunks of the top rows are looked up. Rows a published version points to are never
+    rewritten: compaction copies the live rows to the matrix of a new generation (vectors.<generation>.f32),
+    which readers switch to along with the version.
+
+    With a quantizer, search runs against a compressed copy of the matrix built in memory on first use, and
+    the float32 matrix is only read to re-score the top rescore_candidates rows exactly. The quantizer is fitted
+    once and appended rows are encoded incrementally, it is only fitted again by refit_quantizer, which runs on
+    compaction.
+    """
+
+    VECTORS_FILE_NAME = 'vectors.f32'
+    DATABASE_FILE_NAME = 'index.sqlite3'
+
+    # Number of rows the quantizer is fitted on
+    QUANTIZER_SAMPLE_SIZE = 50000
+
+    # SQLite limits the number of host parameters of a statement
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(
+            self,
+            directory: str,
+            compaction_threshold: float,
+            logger: Logger,
+            quantizer: Optional[VectorQuantizer] = None,
+            rescore_candidates: int = 0
+    ):
+        self.directory = Path(directory)
+        self.compaction_threshold = compaction_threshold
+        self.logger = logger
+        self.quantizer = quantizer
+        self.rescore_candidates = rescore_candidates
+        self.codes: Optional[np.ndarray] = None
+        self.lock = threading.RLock()
+
+        self.dimension: Optional[int] = None
+        self.capacity = 0
+        self.generation = 0
+        self.count = 0
+        self.deleted = np.zeros(0, dtype=bool)
+        self.vectors: Optional[np.memmap] = None
+        self.filter_masks = {}
+        self.loaded_version = None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.database_path, check_same_thread=False)
+        # Readers keep reading the last committed version while the writer appends the next one
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS state (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                version INTEGER NOT NULL,
+                generation INTEGER NOT NULL,
+                dimension INTEGER,
+                capacity INTEGER NOT NULL,
+                count INTEGER NOT NULL
+            )
+            """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                generation INTEGER NOT NULL,
+                row INTEGER NOT NULL,
+                chunk_id TEXT NOT NULL,
+                document_id TEXT,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (generation, row)
+            )
+            """)
+        self.connection.execute('CREATE INDEX IF NOT EXISTS chunks_chunk_id ON chunks (generation, chunk_id)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS chunks_document_id ON chunks (generation, document_id)')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS chunks_deleted ON chunks (generation, row) WHERE deleted = 1'
+        )
+        self.connection.execute('INSERT OR IGNORE INTO state VALUES (0, 0, 0, NULL, 0, 0)')
+        self.connection.commit()
+        self.load()
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.get_vectors_path(self.generation)
+
+    def get_vectors_path(self, generation: int) -> Path:
+        if generation == 0:
+            return self.directory.joinpath(self.VECTORS_FILE_NAME)
+        return self.directory.joinpath(f'vectors.{generation}.f32')
+
+    @property
+    def database_path(self) -> Path:
+        return self.directory.joinpath(self.DATABASE_FILE_NAME)
+
+    def version(self) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT version FROM state').fetchone()[0]
+
+    def load(self):
+        with self.lock:
+            # The state and the tombstones are read in one transaction, so they belong to the same version
+            in_transaction = self.connection.in_transaction
+            if not in_transaction:
+                self.connection.execute('BEGIN')
+            try:
+                version, generation, dimension, capacity, count = self.connection.execute(
+                    'SELECT version, generation, dimension, capacity, count FROM state'
+                ).fetchone()
+                deleted_rows = [row for row, in self.connection.execute(
+                    'SELECT row FROM chunks WHERE generation = ? AND deleted = 1 AND row < ?', (generation, count)
+                )]
+            finally:
+                if not in_transaction:
+                    self.connection.commit()
+
+            self.loaded_version = version
+            if dimension is None:
+                return
+
+            # Rows of a generation are never rewritten, the codes of a newer generation are encoded again
+            if generation != self.generation or self.codes is not None and len(self.codes) > count:
+                self.codes = None
+            self.dimension = dimension
+            self.capacity = capacity
+            self.generation = generation
+            self.count = count
+            self.deleted = np.zeros(count, dtype=bool)
+            self.deleted[deleted_rows] = True
+            self.filter_masks = {}
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                     shape=(self.capacity, self.dimension))
+            self.logger.info(f'Vector index loaded {count - len(deleted_rows)} rows from {self.directory}')
+
+    def reload_if_changed(self):
+        with self.lock:
+            if self.version() != self.loaded_version:
+                self.load()
+
+    def contains(self, chunk_id: str) -> bool:
+        with self.lock:
+            return self.connection.execute(
+                'SELECT 1 FROM chunks WHERE generation = ? AND chunk_id = ? AND deleted = 0 AND row < ? LIMIT 1',
+                (self.generation, chunk_id, self.count)
+            ).fetchone() is not None
+
+    def get_document_chunk_ids(self, document_ids: List[str]) -> Set[str]:
+        """Returns the ids of the live chunks of the documents"""
+        with self.lock:
+            chunk_ids = set()
+            for start in range(0, len(document_ids), self.LOOKUP_BATCH_SIZE):
+                batch = document_ids[start:start + self.LOOKUP_BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                chunk_ids.update(chunk_id for chunk_id, in self.connection.execute(
+                    f'SELECT chunk_id FROM chunks WHERE generation = ? AND document_id IN ({placeholders}) '
+                    f'AND deleted = 0 AND row < ?', (self.generation, *batch, self.count)
+                ))
+            return chunk_ids
+
+    def get_chunks(self, rows: List[int]) -> List[tuple]:
+        """Returns the (id, text, metadata) of the rows, in the order of the rows"""
+        with self.lock:
+            chunks = {}
+            for start in range(0, len(rows), self.LOOKUP_BATCH_SIZE):
+                batch = [int(row) for row in rows[start:start + self.LOOKUP_BATCH_SIZE]]
+                placeholders = ','.join('?' * len(batch))
+                for row, chunk_id, text, metadata in self.connection.execute(
+                        f'SELECT row, chunk_id, text, metadata FROM chunks '
+                        f'WHERE generation = ? AND row IN ({placeholders})',
+                        (self.generation, *batch)
+                ):
+                    chunks[row] = (chunk_id, text, json.loads(metadata))
+            return [chunks[int(row)] for row in rows if int(row) in chunks]
+
+    def find_rows(self, metadata_filter: dict) -> np.ndarray:
+        """Returns the live rows matching the filter. Masks are cached until the index is written again."""
+        with self.lock:
+            key = json.dumps(metadata_filter, sort_keys=True)
+            mask = self.filter_masks.get(key)
+            if mask is None:
+                clause, parameters = filter_to_sql(metadata_filter)
+                matching_rows = [row for row, in self.connection.execute(
+                    f'SELECT row FROM chunks WHERE generation = ? AND row < ? AND ({clause})',
+                    (self.generation, self.count, *parameters)
+                )]
+                mask = np.zeros(self.count, dtype=bool)
+                mask[matching_rows] = True
+                self.filter_masks[key] = mask
+            return np.flatnonzero(mask & ~self.deleted)
+
+    def query(self, query_vector: np.ndarray, k: int, metadata_filter: Optional[dict] = None) -> List[tuple]:
+        """
+        Returns the (id, text, metadata) of the k most similar live rows matching the filter. The reload, the
+        search and the row lookups hold the lock together, a concurrent reload would renumber the rows.
+        """
+        with self.lock:
+            self.reload_if_changed()
+            rows = self.find_rows(metadata_filter) if metadata_filter else None
+            return self.get_chunks([row for row, _ in self.search(query_vector=query_vector, k=k, rows=rows)])
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors: np.ndarray):
+        """Appends the rows, they are visible to other processes once saved"""
+        with self.lock:
+            vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+
+            start = self.count
+            self.__reserve(start + len(ids))
+            self.vectors[start:start + len(ids)] = vectors
+
+            # Adding an existing id replaces its row, like an upsert of Chroma
+            self.__delete_rows(self.__find_live_rows(list(set(ids))))
+            deleted = np.zeros(len(ids), dtype=bool)
+            last_rows = {}
+            for row, chunk_id in enumerate(ids):
+                if chunk_id in last_rows:
+                    deleted[last_rows[chunk_id]] = True
+                last_rows[chunk_id] = row
+
+            self.connection.executemany(
+                'INSERT INTO chunks (generation, row, chunk_id, document_id, text, metadata, deleted) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(self.generation, start + row, chunk_id, metadata.get('document_id'), text, json.dumps(metadata),
+                  int(deleted[row]))
+                 for row, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))]
+            )
+            self.count += len(ids)
+            self.deleted = np.concatenate([self.deleted, deleted])
+            self.filter_masks = {}
+
+    def delete(self, ids: List[str]):
+        with self.lock:
+            self.__delete_rows(self.__find_live_rows(ids))
+
+    def save(self):
+        """Commits the rows added and deleted since the last save as a new version"""
+        with self.lock:
+            if self.dimension is None:
+                return
+
+            compacted = False
+            if self.count and self.deleted.sum() / self.count > self.compaction_threshold:
+                self.__compact()
+                compacted = True
+            if not self.connection.in_transaction:
+                return
+
+            self.vectors.flush()
+            self.connection.execute(
+                'UPDATE state SET version = version + 1, generation = ?, dimension = ?, capacity = ?, count = ?',
+                (self.generation, self.dimension, self.capacity, self.count)
+            )
+            self.connection.commit()
+            if compacted:
+                self.__remove_old_generations()
+            self.loaded_version = self.version()
+
+    def search(self, query_vector: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[tuple]:
+        """Returns the (row, score) of the k rows with the highest cosine similarity to the query vector"""
+        with self.lock:
+            if self.dimension is None or self.count == 0:
+                return []
+
+            query_vector = normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+            candidates = np.arange(self.count) if rows is None else rows
+            if len(candidates) == 0:
+                return []
+
+            if self.quantizer is None:
+                scores = self.vectors[:self.count] @ query_vector if rows is None else self.vectors[rows] @ query_vector
+            else:
+                codes = self.__get_codes()
+                scores = self.quantizer.scores(codes if rows is None else codes[rows], query_vector)
+            if rows is None:
+                scores[self.deleted] = -np.inf
+
+            if self.quantizer is not None and self.rescore_candidates > k:
+                top = self.__top(scores, self.rescore_candidates)
+                top = top[scores[top] != -np.inf]
+                # Exact scores of the candidates, read from the float32 matrix in row order
+                candidate_rows = np.sort(candidates[top])
+                candidates = candidate_rows
+                scores = self.vectors[candidate_rows] @ query_vector
+
+            top = self.__top(scores, k)
+            return [(int(candidates[index]), float(scores[index])) for index in top
+                    if scores[index] != -np.inf]
+
+    def refit_quantizer(self):
+        """Fits the quantizer again on a sample of the live rows and encodes the whole matrix with it"""
+        with self.lock:
+            if self.quantizer is None or self.count == 0:
+                return
+
+            started_at = time.perf_counter()
+            live_rows = np.flatnonzero(~self.deleted)
+            if len(live_rows) == 0:
+                live_rows = np.arange(self.count)
+            sample_size = min(len(live_rows), self.QUANTIZER_SAMPLE_SIZE)
+            sample_rows = np.sort(np.random.default_rng(0).choice(live_rows, size=sample_size, replace=False))
+            self.quantizer.fit(self.vectors[sample_rows])
+            self.codes = self.__encode(0, self.count)
+
+            # Mapping the matrix again releases the pages read while encoding, only re-scored rows are paged in later
+            self.vectors.flush()
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                     shape=(self.capacity, self.dimension))
+            self.logger.info(f'Vector index encoded {self.count} rows as {self.quantizer.name} '
+                             f'({self.codes.nbytes / 2 ** 20:.1f}MB) in {time.perf_counter() - started_at:.1f}s')
+
+    def memory_bytes(self) -> int:
+        """Size of the matrix searched by queries"""
+        if self.quantizer is not None:
+            return self.__get_codes().nbytes if self.count else 0
+        return self.count * (self.dimension or 0) * np.dtype(np.float32).itemsize
+
+    @staticmethod
+    def __top(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def __get_codes(self) -> np.ndarray:
+        if not self.quantizer.fitted:
+            self.refit_quantizer()
+        elif self.codes is None:
+            self.codes = self.__encode(0, self.count)
+        elif len(self.codes) < self.count:
+            # Only the rows appended since the last query are encoded
+            self.codes = np.concatenate([self.codes, self.__encode(len(self.codes), self.count)])
+        return self.codes
+
+    def __encode(self, start: int, stop: int) -> np.ndarray:
+        codes = [self.quantizer.encode(self.vectors[block_start:min(block_start + VectorQuantizer.BLOCK_SIZE, stop)])
+                 for block_start in range(start, stop, VectorQuantizer.BLOCK_SIZE)]
+        return np.concatenate(codes)
+
+    def __find_live_rows(self, ids: List[str]) -> List[int]:
+        rows = []
+        for start in range(0, len(ids), self.LOOKUP_BATCH_SIZE):
+            batch = ids[start:start + self.LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows.extend(row for row, in self.connection.execute(
+                f'SELECT row FROM chunks WHERE generation = ? AND chunk_id IN ({placeholders}) '
+                f'AND deleted = 0 AND row < ?', (self.generation, *batch, self.count)
+            ))
+        return rows
+
+    def __delete_rows(self, rows: List[int]):
+        if not rows:
+            return
+        self.connection.executemany('UPDATE chunks SET deleted = 1 WHERE generation = ? AND row = ?',
+                                    [(self.generation, row) for row in rows])
+        self.deleted[rows] = True
+        self.filter_masks = {}
+
+    def __reserve(self, rows: int):
+        if rows <= self.capacity:
+            return
+
+        # Grow geometrically, so appending is amortized and the file is remapped rarely
+        capacity = max(rows, self.capacity * 2, 1024)
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        with open(self.vectors_path, 'ab') as file:
+            file.truncate(capacity * self.dimension * np.dtype(np.float32).itemsize)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dimension))
+        self.capacity = capacity
+
+    def __compact(self):
+        # Readers of other processes may still map the current matrix with the published version, so the live
+        # rows are copied to a new file instead of being moved in place
+        live_rows = np.flatnonzero(~self.deleted)
+        self.logger.info(f'Vector index compacting {self.count - len(live_rows)} deleted rows')
+
+        generation = self.generation + 1
+        capacity = max(len(live_rows), 1024)
+        vectors_path = self.get_vectors_path(generation)
+        with open(vectors_path, 'wb') as file:
+            file.truncate(capacity * self.dimension * np.dtype(np.float32).itemsize)
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dimension))
+        for start in range(0, len(live_rows), VectorQuantizer.BLOCK_SIZE):
+            block = live_rows[start:start + VectorQuantizer.BLOCK_SIZE]
+            vectors[start:start + len(block)] = self.vectors[block]
+
+        self.vectors.flush()
+        self.vectors = vectors
+        self.capacity = capacity
+        self.generation = generation
+        self.connection.execute(
+            'INSERT INTO chunks (generation, row, chunk_id, document_id, text, metadata) '
+            'SELECT ?, ROW_NUMBER() OVER (ORDER BY row) - 1, chunk_id, document_id, text, metadata FROM chunks '
+            'WHERE generation = ? AND row < ? AND deleted = 0',
+            (generation, generation - 1, self.count)
+        )
+        # The rows of the previous generation stay for the readers that still map its matrix
+        self.connection.execute('DELETE FROM chunks WHERE generation < ?', (generation - 1,))
+        self.count = len(live_rows)
+        self.deleted = np.zeros(len(live_rows), dtype=bool)
+        self.filter_masks = {}
+        self.codes = None
+        if self.quantizer is not None and self.quantizer.fitted:
+            self.refit_quantizer()
+
+    def __remove_old_generations(self):
+        # The previous generation stays for readers that loaded the version just before it was committed
+        for path in self.directory.glob('vectors*.f32'):
+            parts = path.name.split('.')
+            generation = int(parts[1]) if len(parts) == 3 and parts[1].isdigit() else 0
+            if generation < self.generation - 1:
+                try:
+                    path.unlink()
+                except OSError as e:
+                    self.logger.warning(f'Unable to remove the vector index file {path}: {e}')
+
+
+class NumpyVectorStoreRetriever(IVectorStoreRetriever):
+    """
+    In process alternative to the Chroma vector store: an exact top-k search over a memory mapped matrix of
+    normalized embeddings. Opening it is instant, and processes mapping the same files share its pages.
+    """
+
+    def __init__(
+            self,
+            numpy_index_config: NumpyIndexConfiguration,
+            huggingface_embed_config: HuggingFaceEmbeddingConfiguration,
+            logger: Logger
+    ):
+        self.logger = logger
+        self.model = create_embedding_model(huggingface_embed_config=huggingface_embed_config, logger=logger)
+        self.query_embedding_cache = QueryEmbeddingCache(
+            max_size=huggingface_embed_config.query_cache_size,
+            ttl_seconds=huggingface_embed_config.query_cache_ttl_seconds
+        )
+
+        directory = Path(numpy_index_config.persist_directory).joinpath(numpy_index_config.collection_name)
+        quantizer = None
+        if numpy_index_config.storage_type != 'float32' or numpy_index_config.pca_dimension:
+            quantizer = VectorQuantizer(
+                storage_type=numpy_index_config.storage_type,
+                pca_dimension=numpy_index_config.pca_dimension
+            )
+
+        self.index = NumpyVectorIndex(
+            directory=str(directory),
+            compaction_threshold=numpy_index_config.compaction_threshold,
+            logger=logger,
+            quantizer=quantizer,
+            rescore_candidates=numpy_index_config.rescore_candidates
+        )
+
+    def embed(self, chunks):
+        """Adds texts without a document, identified by their content: a text already in the index is skipped"""
+        new_chunks = {}
+        for chunk in dict.fromkeys(chunks):
+            chunk_id = str(uuid.uuid5(uuid.NAMESPACE_URL, content_hash(chunk)))
+            if not self.index.contains(chunk_id):
+                new_chunks[chunk_id] = chunk
+
+        if new_chunks:
+            vectors = self.model.embed_documents(list(new_chunks.values()))
+            self.index.add(ids=list(new_chunks.keys()), texts=list(new_chunks.values()),
+                           metadatas=[{} for _ in new_chunks], vectors=np.asarray(vectors))
+            self.index.save()
+
+    def upsert(self, chunks: List[DocumentChunk], document_ids: Optional[List[str]] = None) -> UpsertResult:
+        """Same semantics as ChromaDbVectorStoreRetriever.upsert"""
+        if document_ids is None:
+            document_ids = list(dict.fromkeys(chunk.document_id for chunk in chunks))
+        if not document_ids:
+            return UpsertResult()
+
+        with self.index.lock:
+            self.index.reload_if_changed()
+            existing_ids = self.index.get_document_chunk_ids(document_ids)
+
+        new_chunks = {}
+        for chunk in chunks:
+            if chunk.chunk_id not in existing_ids:
+                new_chunks[chunk.chunk_id] = chunk
+
+        chunk_ids = {chunk.chunk_id for chunk in chunks}
+        stale_ids = list(existing_ids - chunk_ids)
+        self.index.delete(ids=stale_ids)
+
+        if new_chunks:
+            vectors = self.model.embed_documents([chunk.text for chunk in new_chunks.values()])
+            self.index.add(
+                ids=list(new_chunks.keys()),
+                texts=[chunk.text for chunk in new_chunks.values()],
+                metadatas=[{**chunk.metadata, 'document_id': chunk.document_id, 'chunk_ordinal': chunk.ordinal}
+                           for chunk in new_chunks.values()],
+                vectors=np.asarray(vectors)
+            )
+        self.index.save()
+
+        result = UpsertResult(added=len(new_chunks), deleted=len(stale_ids),
+                              unchanged=len(chunk_ids & existing_ids))
+        self.logger.info(f'Vector index upserted chunks of {len(document_ids)} documents: {result.added} added, '
+                         f'{result.deleted} deleted, {result.unchanged} unchanged')
+        return result
+
+    def query(self, query: str, k: int = 5, metadata_filter: Optional[dict] = None) -> list[Document]:
+        return self.query_by_vector(vector=self.embed_query(query=query), k=k, metadata_filter=metadata_filter)
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.query_embedding_cache.get_or_embed(query, self.model.embed_query)
+
+    def get_query_embedding_statistics(self) -> QueryEmbeddingCacheStatistics:
+        return self.query_embedding_cache.get_statistics()
+
+    def version(self):
+        self.index.reload_if_changed()
+        return self.index.loaded_version
+
+    def query_by_vector(self, vector: List[float], k: int = 5, metadata_filter: Optional[dict] = None) -> list[Document]:
+        query_vector = np.asarray(vector, dtype=np.float32)
+        return [
+            Document(id=chunk_id, page_content=text, metadata=metadata)
+            for chunk_id, text, metadata in self.index.query(query_vector=query_vector, k=k,
+                                                             metadata_filter=metadata_filter)
+        ]
@@ -1,60 +1,233 @@
 import fitz
-import io
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, List, Iterator
 from pydantic import BaseModel
 import pymupdf4llm
+from pymupdf4llm.helpers.pymupdf_rag import IdentifyHeaders
 from pymupdf import Document
-from src.data_access.graphs import DocumentGraph
+from src.data_access.graphs import DocumentGraph, DocumentNode
 from pathlib import Path
 from src.infra.configuration import ParsingConfiguration
+from src.rag.html_conversion import html_to_markdown
 import os
 
 class ParsingRequest(BaseModel):
     document_id: str
 
+class ParsingResult(BaseModel):
+    document_id: str
+    parsing_storage_path: Optional[str] = None
+    characters: int = 0
+    error: Optional[str] = None
+
+    @property
+    def is_success(self) -> bool:
+        return self.error is None
+
 
 class IParser(ABC):
     @abstractmethod
     def parse(self, request: ParsingRequest):
         pass
 
+    @abstractmethod
+    def stream(self, request: ParsingRequest) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def parse_to_file(self, request: ParsingRequest) -> str:
+        pass
+
+    @abstractmethod
+    def parse_many(self, requests: List[ParsingRequest]) -> Iterator[ParsingResult]:
+        pass
+
+def convert_pdf_to_markdown(document_path: str, show_progress: bool = True) -> str:
+    # Opening by path lets MuPDF read the file on demand instead of holding a copy of it in memory
+    document: Document = fitz.open(document_path, filetype='pdf')
+
+    return pymupdf4llm.to_markdown(document, show_progress=show_progress)
+
+def convert_html_to_markdown(document_path: str, show_progress: bool = False) -> str:
+    # show_progress is part of the converter signature, an html page is converted in one step
+    with open(document_path, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    return html_to_markdown(html)
+
+def iter_pdf_pages(document_path: str, page_batch_size: int) -> Iterator[str]:
+    """Yields the Markdown of every page, converting page_batch_size pages at a time"""
+    with fitz.open(document_path, filetype='pdf') as document:
+        # Headers are identified once, so every page batch uses the same heading levels
+        hdr_info = IdentifyHeaders(document)
+        batch_size = max(1, page_batch_size)
+
+        for start in range(0, document.page_count, batch_size):
+            pages = list(range(start, min(start + batch_size, document.page_count)))
+            page_chunks = pymupdf4llm.to_markdown(document, pages=pages, hdr_info=hdr_info, page_chunks=True)
+            for page_chunk in page_chunks:
+                yield page_chunk['text']
+
+def iter_html_pages(document_path: str, page_batch_size: int) -> Iterator[str]:
+    yield convert_html_to_markdown(document_path)
+
+def write_parsed_document(converter, document_path: str, parsed_file_path: str, show_progress: bool = True) -> str:
+    parsed_content = converter(document_path, show_progress=show_progress)
+
+    output_directory = str(Path(parsed_file_path).parent)
+    os.makedirs(output_directory, exist_ok=True)
+
+    with open(parsed_file_path, "w", encoding="utf-8") as file:
+        file.write(parsed_content)
+
+    return parsed_content
+
+def write_parsed_pages(pages: Iterator[str], parsed_file_path: str) -> Iterator[str]:
+    """Writes the pages to the parsed file as they are converted and yields them to the caller"""
+    output_directory = str(Path(parsed_file_path).parent)
+    os.makedirs(output_directory, exist_ok=True)
+
+    with open(parsed_file_path, "w", encoding="utf-8") as file:
+        for page in pages:
+            file.write(page)
+            yield page
+
+def write_parsed_document_in_worker(converter, document_path: str, parsed_file_path: str) -> int:
+    # Only the size travels back to the parent process, the content is already on disk. Progress bars of
+    # concurrent workers would interleave on the console, so they are turned off
+    return len(write_parsed_document(converter, document_path, parsed_file_path, show_progress=False))
+
+def write_parsed_pages_in_worker(page_iterator, document_path: str, parsed_file_path: str, page_batch_size: int) -> int:
+    pages = page_iterator(document_path, page_batch_size)
+    return sum(len(page) for page in write_parsed_pages(pages, parsed_file_path))
+
 class DocumentParser(IParser):
+    converter = staticmethod(convert_pdf_to_markdown)
+    page_iterator = staticmethod(iter_pdf_pages)
+
     def __init__(self, graph: DocumentGraph, configuration: ParsingConfiguration):
         self.graph = graph
         self.configuration = configuration
 
-    def parse(self, request: ParsingRequest):
+    def prepare(self, request: ParsingRequest) -> DocumentNode:
+        """Looks the document up and assigns its parsing storage path"""
         document_id = request.document_id
         document_node = self.graph.get_document_node_by_id(document_id=document_id)
 
         if document_node is None:
             raise Exception(f'Unable to parse a document with id={document_id}. Document was not found')
 
-        leaf_path = self.graph.get_leaf_path(leaf_id=document_id)
+        leaf_path = self.graph.get_leaf_path(leaf_id=document_id, site_name=document_node.site_name)
         parsed_docs_path = Path(self.configuration.storage_path).joinpath('parsed_docs')
         parsed_file_path = str(parsed_docs_path.joinpath(f'{leaf_path}.md'))
         document_node.parsing_storage_path = parsed_file_path
-        self.graph.update_node(node=document_node)
 
         if document_node.storage_path is None:
             raise Exception(f'Unable to parse a document with id={document_id}. Storage path was not found')
 
-        document_path = document_node.storage_path
-        with open(document_path, "rb") as f:
-            document_bytes = f.read()
+        return document_node
+
+    def parse(self, request: ParsingRequest):
+        """Parses the document and returns its Markdown, converted page batch by page batch in streaming mode"""
+        if self.configuration.streaming:
+            return ''.join(self.stream(request=request))
+
+        document_node = self.prepare(request=request)
+        self.graph.update_node(node=document_node)
 
-        document_stream = io.BytesIO(document_bytes)
-        document: Document = fitz.open(
-            stream=document_stream,
-            filetype='pdf'
+        return write_parsed_document(
+            self.converter,
+            document_node.storage_path,
+            document_node.parsing_storage_path
         )
 
-        parsed_content = pymupdf4llm.to_markdown(document, show_progress=True)
+    def stream(self, request: ParsingRequest) -> Iterator[str]:
+        """
+        Converts the document page_batch_size pages at a time, writing the Markdown to the parsing storage path
+        incrementally and yielding it page by page
+        """
+        document_node = self.prepare(request=request)
+        self.graph.update_node(node=document_node)
+
+        pages = self.page_iterator(document_node.storage_path, self.configuration.page_batch_size)
+        yield from write_parsed_pages(pages=pages, parsed_file_path=document_node.parsing_storage_path)
+
+    def parse_to_file(self, request: ParsingRequest) -> str:
+        """
+        Streams the document to its parsing storage path without holding its Markdown in memory, and returns
+        the path
+        """
+        document_node = self.prepare(request=request)
+        self.graph.update_node(node=document_node)
+
+        pages = self.page_iterator(document_node.storage_path, self.configuration.page_batch_size)
+        for _ in write_parsed_pages(pages=pages, parsed_file_path=document_node.parsing_storage_path):
+            pass
+        return document_node.parsing_storage_path
 
-        output_directory = str(Path(parsed_file_path).parent)
-        os.makedirs(output_directory, exist_ok=True)
+    def parse_many(self, requests: List[ParsingRequest]) -> Iterator[ParsingResult]:
+        """
+        Converts the documents on a process pool and yields their results as they complete. Documents are
+        prepared and submitted lazily, at most two per worker are in flight, so the workers start right away
+        and pending documents do not pile up in memory. Graph lookups and updates stay in the calling process,
+        and a failing document is reported in its result.
+        """
+        max_workers = self.configuration.max_workers or os.cpu_count() or 1
+        requests = iter(requests)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            while True:
+                while len(futures) < 2 * max_workers:
+                    request = next(requests, None)
+                    if request is None:
+                        break
+                    try:
+                        document_node = self.prepare(request=request)
+                    except Exception as e:
+                        yield ParsingResult(document_id=request.document_id, error=str(e))
+                        continue
+                    futures[self.__submit(executor, document_node)] = document_node
+
+                if not futures:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    document_node = futures.pop(future)
+                    try:
+                        characters = future.result()
+                        self.graph.update_node(node=document_node)
+                    except Exception as e:
+                        yield ParsingResult(document_id=document_node.id, error=str(e))
+                        continue
+
+                    yield ParsingResult(
+                        document_id=document_node.id,
+                        parsing_storage_path=document_node.parsing_storage_path,
+                        characters=characters
+                    )
+
+    def __submit(self, executor: ProcessPoolExecutor, document_node: DocumentNode):
+        if self.configuration.streaming:
+            return executor.submit(
+                write_parsed_pages_in_worker,
+                self.page_iterator,
+                document_node.storage_path,
+                document_node.parsing_storage_path,
+                self.configuration.page_batch_size
+            )
+        return executor.submit(
+            write_parsed_document_in_worker,
+            self.converter,
+            document_node.storage_path,
+            document_node.parsing_storage_path
+        )
 
-        with open(parsed_file_path, "w", encoding="utf-8") as file:
-            file.write(parsed_content)
+    def convert(self, document_path: str) -> str:
+        return self.converter(document_path)
 
-        return parsed_content
+class HtmlDocumentParser(DocumentParser):
+    """Parses scrapped html pages straight to Markdown, skipping the PDF rendering and extraction"""
+    converter = staticmethod(convert_html_to_markdown)
+    page_iterator = staticmethod(iter_html_pages)
@@ -0,0 +1,85 @@
+from typing import Optional, Tuple
+import numpy as np
+
+STORAGE_TYPES = {
+    'float32': np.float32,
+    'float16': np.float16,
+    'int8': np.uint8,
+}
+
+class VectorQuantizer:
+    """
+    Compresses normalized embeddings for search: an optional PCA projection to pca_dimension followed by
+    float16 storage or int8 scalar quantization (per dimension minimum and step over 256 levels). Scores of
+    the compressed vectors approximate the inner products of the originals, up to a per query constant.
+    """
+
+    # Rows are decompressed a cache sized block at a time, scoring never materializes a float32 copy of the matrix
+    BLOCK_SIZE = 4096
+
+    def __init__(self, storage_type: str = 'float32', pca_dimension: Optional[int] = None):
+        if storage_type not in STORAGE_TYPES:
+            raise ValueError(f'Unsupported vector storage type {storage_type}, expected one of {list(STORAGE_TYPES)}')
+
+        self.storage_type = storage_type
+        self.pca_dimension = pca_dimension
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+        self.minimum: Optional[np.ndarray] = None
+        self.step: Optional[np.ndarray] = None
+        self.fitted = False
+
+    @property
+    def name(self) -> str:
+        return self.storage_type + (f'-pca{self.pca_dimension}' if self.pca_dimension else '')
+
+    def fit(self, vectors: np.ndarray):
+        """Learns the PCA projection and the quantization ranges from a sample of the vectors"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.pca_dimension:
+            self.mean = vectors.mean(axis=0)
+            centered = vectors - self.mean
+            # The eigenvectors of the covariance matrix are the principal axes, by decreasing variance
+            eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+            order = np.argsort(eigenvalues)[::-1][:self.pca_dimension]
+            self.components = np.ascontiguousarray(eigenvectors[:, order], dtype=np.float32)
+
+        if self.storage_type == 'int8':
+            projected = self.transform(vectors)
+            self.minimum = projected.min(axis=0)
+            self.step = (projected.max(axis=0) - self.minimum) / 255
+            self.step[self.step == 0] = 1.0
+        self.fitted = True
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.components is None:
+            return vectors
+        return (vectors - self.mean) @ self.components
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        projected = self.transform(vectors)
+        if self.storage_type == 'int8':
+            return np.clip(np.rint((projected - self.minimum) / self.step), 0, 255).astype(np.uint8)
+        return projected.astype(STORAGE_TYPES[self.storage_type])
+
+    def prepare_query(self, query_vector: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Returns the vector and offset scoring the codes. The PCA mean is not subtracted from the query: it would
+        shift every score by the same amount and leave the ranking unchanged.
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if self.components is not None:
+            query_vector = query_vector @ self.components
+
+        if self.storage_type == 'int8':
+            return query_vector * self.step, float(self.minimum @ query_vector)
+        return query_vector, 0.0
+
+    def scores(self, codes: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+        vector, offset = self.prepare_query(query_vector)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.BLOCK_SIZE):
+            block = codes[start:start + self.BLOCK_SIZE]
+            scores[start:start + len(block)] = block.astype(np.float32) @ vector
+        return scores + offset
@@ -0,0 +1,164 @@
+import os
+import re
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+from logging import Logger
+from src.infra.configuration import ScrappingConfiguration
+
+class WkhtmltopdfWorker:
+    """
+    Long living wkhtmltopdf process started with --read-args-from-stdin. Every job is a line of arguments
+    written to its stdin, so the process start up cost is paid once per worker instead of once per page.
+    """
+
+    def __init__(self, executable: str, timeout_seconds: float, logger: Logger):
+        self.executable = executable
+        self.timeout_seconds = timeout_seconds
+        self.logger = logger
+        self.process: Optional[subprocess.Popen] = None
+        self.messages: Optional[queue.Queue] = None
+        self.jobs = 0
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.executable, '--read-args-from-stdin'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        self.messages = queue.Queue()
+        self.jobs = 0
+        threading.Thread(
+            target=WkhtmltopdfWorker.__read_messages,
+            args=(self.process, self.messages),
+            daemon=True
+        ).start()
+        self.logger.debug(f'Started wkhtmltopdf worker process {self.process.pid}')
+
+    def stop(self, kill: bool = False):
+        if self.process is None:
+            return
+
+        try:
+            if kill:
+                self.process.kill()
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def render(self, url: str, output_file_path: str):
+        if not self.is_alive():
+            self.start()
+
+        # Render to a temporary file of this job, so neither a stale output of a previous run nor the output of
+        # a concurrent job is ever taken for a result
+        output_path = Path(output_file_path)
+        rendering_path = output_path.with_name(f'{output_path.stem}.{uuid.uuid4().hex}.rendering{output_path.suffix}')
+
+        while not self.messages.empty():
+            self.messages.get_nowait()
+
+        job = f'{self.__quote(url)} {self.__quote(rendering_path.as_posix())}\n'
+        try:
+            self.process.stdin.write(job.encode('utf-8'))
+            self.process.stdin.flush()
+        except OSError as e:
+            self.stop()
+            raise IOError(f'wkhtmltopdf worker crashed before rendering {url}: {e}')
+
+        self.jobs += 1
+        errors = self.__wait_for_job(url=url)
+
+        if not rendering_path.exists() or rendering_path.stat().st_size == 0:
+            rendering_path.unlink(missing_ok=True)
+            raise IOError(f'wkhtmltopdf failed to render {url}: {" ".join(errors) or "no output"}')
+
+        os.replace(rendering_path, output_path)
+
+    def __wait_for_job(self, url: str) -> list:
+        errors = []
+        deadline = time.monotonic() + self.timeout_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.logger.warning(f'wkhtmltopdf worker timed out rendering {url}, restarting it')
+                self.stop(kill=True)
+                raise TimeoutError(f'Rendering of {url} timed out after {self.timeout_seconds}s')
+
+            try:
+                message = self.messages.get(timeout=remaining)
+            except queue.Empty:
+                continue
+
+            if message is None:
+                self.logger.warning(f'wkhtmltopdf worker exited while rendering {url}, restarting it')
+                self.stop()
+                raise IOError(f'wkhtmltopdf worker crashed while rendering {url}: {" ".join(errors)}')
+            if message.startswith('Error') or message.startswith('Exit with code'):
+                errors.append(message)
+            if message.startswith('Done') or message.startswith('Exit with code'):
+                return errors
+
+    @staticmethod
+    def __quote(argument: str) -> str:
+        return '"' + argument.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    @staticmethod
+    def __read_messages(process: subprocess.Popen, messages: queue.Queue):
+        # Progress bars are redrawn with carriage returns, so both \r and \n end a message
+        buffer = ''
+        for data in iter(lambda: process.stderr.read1(4096), b''):
+            buffer += data.decode('utf-8', errors='replace')
+            *lines, buffer = re.split(r'[\r\n]', buffer)
+            for line in lines:
+                if line.strip():
+                    messages.put(line.strip())
+        messages.put(None)
+
+class WkhtmltopdfRendererPool:
+    """Bounded pool of wkhtmltopdf workers, recycled after a number of jobs and restarted after failures"""
+
+    def __init__(self, configuration: ScrappingConfiguration, logger: Logger):
+        self.configuration = configuration
+        self.logger = logger
+
+        executable = configuration.wkhtmltopdf_path or shutil.which('wkhtmltopdf')
+        if executable is None:
+            raise FileNotFoundError('wkhtmltopdf executable was not found. '
+                                    'Install it or set scrapping.wkhtmltopdf_path')
+
+        # Pages are rendered by the scrapping threads, workers beyond max_concurrency would never be used
+        pool_size = configuration.renderer_pool_size or configuration.max_concurrency
+        self.workers = queue.Queue()
+        for _ in range(max(1, pool_size)):
+            worker = WkhtmltopdfWorker(
+                executable=executable,
+                timeout_seconds=configuration.renderer_timeout_seconds,
+                logger=logger
+            )
+            self.workers.put(worker)
+
+    def render(self, url: str, output_file_path: str):
+        worker: WkhtmltopdfWorker = self.workers.get()
+        try:
+            worker.render(url=url, output_file_path=output_file_path)
+            if worker.jobs >= self.configuration.renderer_max_jobs_per_worker:
+                worker.stop()
+        finally:
+            self.workers.put(worker)
+
+    def close(self):
+        for worker in list(self.workers.queue):
+            worker.stop()
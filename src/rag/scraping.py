@@ -1,19 +1,23 @@
 import os
+import time
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 
 from pydantic import BaseModel, field_validator
 from typing import Optional, List, Any
 from abc import ABC, abstractmethod
+import atexit
+import pdfkit
 import requests
-from bs4 import BeautifulSoup
 from pathlib import Path
-from src.data_access.graphs import DocumentGraph, DocumentTree, DocumentRelationship
+from logging import Logger
+from src.data_access.graphs import DocumentGraph, DocumentTree, DocumentRelationship, DocumentNode
 from src.infra.configuration import ScrappingConfiguration
-
-class IUrlFilter(ABC):
-    @abstractmethod
-    def apply(self, url: str) -> bool:
-        pass
+from src.rag.crawling import IUrlFilter, IWebCrawler, extract_links, normalize_url
+from src.rag.http_cache import HttpCache
+from src.rag.rendering import WkhtmltopdfRendererPool
 
 class WebPageScrappingRequest(BaseModel):
     url: str = []
@@ -32,7 +36,19 @@ class WebSiteScrappingRequest(BaseModel):
             raise ValueError("url_filter must be an instance of IUrlFilter")
         return value
 
+class WebSiteScrappingResult(BaseModel):
+    site_name: str
+    total: int = 0
+    succeeded: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    failed_urls: List[str] = []
+    elapsed_seconds: float = 0.0
+    pages_per_second: float = 0.0
+
 class IWebPageScrapper(ABC):
+    file_extension: str = 'pdf'
+
     @abstractmethod
     def scrap(self, request: WebPageScrappingRequest):
         pass
@@ -50,22 +66,51 @@ class WebPageScrapper(IWebPageScrapper):
 
         os.makedirs(output_directory, exist_ok=True)
 
-        import pdfkit
         pdfkit.from_url(url, output_file_path)
 
     def get_links(self, url: str, persist:bool=False) -> List[str]:
         """Extracts all links from the webpage"""
         response = requests.get(url)
-        soup = BeautifulSoup(response.text, "html.parser")
+        links = extract_links(html=response.text, base_url=response.url)
+        normalized_links = [normalize_url(link) for link in links]
+
+        return list(dict.fromkeys(link for link in normalized_links if link))
+
+class HtmlWebPageScrapper(WebPageScrapper):
+    """Stores the raw html of the page, to be converted to Markdown by the HtmlDocumentParser"""
+    file_extension = 'html'
+
+    def __init__(self, configuration: ScrappingConfiguration):
+        self.configuration = configuration
+        self.session = requests.Session()
+
+    def scrap(self, request: WebPageScrappingRequest):
+        url = request.url
+        output_file_path = request.output_file_path
+        output_directory = str(Path(output_file_path).parent)
 
-        # Extract all anchor tags and get their href
-        links = [a["href"] for a in soup.find_all("a", href=True)]
+        os.makedirs(output_directory, exist_ok=True)
+
+        response = self.session.get(url, timeout=self.configuration.request_timeout_seconds)
+        response.raise_for_status()
+        with open(output_file_path, "w", encoding="utf-8") as file:
+            file.write(response.text)
+
+class PooledWebPageScrapper(WebPageScrapper):
+    """Renders pages to PDF on a pool of persistent wkhtmltopdf processes"""
+
+    def __init__(self, configuration: ScrappingConfiguration, logger: Logger):
+        self.renderer_pool = WkhtmltopdfRendererPool(configuration=configuration, logger=logger)
+        atexit.register(self.renderer_pool.close)
+
+    def scrap(self, request: WebPageScrappingRequest):
+        url = request.url
+        output_file_path = request.output_file_path
+        output_directory = str(Path(output_file_path).parent)
 
-        # Filter out only relevant absolute URLs
-        base_url = url if url.endswith("/") else url + "/"
-        full_links = [link if link.startswith("http") else base_url + link.lstrip("/") for link in links]
+        os.makedirs(output_directory, exist_ok=True)
 
-        return list(set(full_links))
+        self.renderer_pool.render(url=url, output_file_path=output_file_path)
 
 class IWebSiteScrapper(ABC):
     @abstractmethod
@@ -80,18 +125,28 @@ class WebsiteScrapper(IWebSiteScrapper):
     def __init__(
             self,
             scrapper: IWebPageScrapper,
+            crawler: IWebCrawler,
+            http_cache: HttpCache,
             graph: DocumentGraph,
-            configuration: ScrappingConfiguration
+            configuration: ScrappingConfiguration,
+            logger: Logger
     ):
         self.scrapper = scrapper
+        self.crawler = crawler
+        self.http_cache = http_cache
         self.graph = graph
         self.configuration = configuration
+        self.logger = logger
+        self.host_semaphores = {}
+        self.host_semaphores_lock = threading.Lock()
 
     def create_nodes_and_relationships(self, document_tree: DocumentTree):
         tree = document_tree.tree
+        nodes = []
+        relationships = []
         for tree_node in tree.all_nodes_itr():
             node = tree_node.data
-            self.graph.create_node(node=node)
+            nodes.append(node)
 
             if tree_node.is_root():
                 continue
@@ -103,7 +158,10 @@ class WebsiteScrapper(IWebSiteScrapper):
                 end_document_id=node.id,
                 id = str(uuid.uuid4())
             )
-            self.graph.create_relationship(relationship=relationship)
+            relationships.append(relationship)
+
+        self.graph.create_nodes(nodes=nodes)
+        self.graph.create_relationships(relationships=relationships)
 
 
     def scrap(self, request: WebSiteScrappingRequest):
@@ -115,37 +173,124 @@ class WebsiteScrapper(IWebSiteScrapper):
         links = self.get_links(url=site_url, url_filter=url_filter, persist=persist_urls)
         tree = DocumentTree.from_url_list(urls=links, site_name=site_name)
         self.create_nodes_and_relationships(document_tree=tree)
+        self.graph.cache_leaf_paths(leaf_paths=tree.get_leaf_paths())
 
         leaves = self.graph.get_leaves_by_site_name(site_name=site_name)
         for leaf in leaves:
-            leaf_path = self.graph.get_leaf_path(leaf_id=leaf.id)
+            leaf_path = self.graph.get_leaf_path(leaf_id=leaf.id, site_name=site_name)
             docs_path = Path(self.configuration.storage_path).joinpath('docs')
-            full_leaf_path = str(docs_path.joinpath(f'{leaf_path}.pdf'))
+            full_leaf_path = str(docs_path.joinpath(f'{leaf_path}.{self.scrapper.file_extension}'))
             leaf.storage_path = full_leaf_path
-            self.graph.update_node(node=leaf)
-
-            page_scrapping_request = WebPageScrappingRequest(
-                url=leaf.url,
-                output_file_path=leaf.storage_path
-            )
-            self.scrapper.scrap(request=page_scrapping_request)
-
 
-        #TODO: Execute scrapping
+        return self.scrap_pages(site_name=site_name, leaves=leaves)
 
+    def scrap_pages(self, site_name: str, leaves: List[DocumentNode]) -> WebSiteScrappingResult:
+        """
+        Scraps the leaves concurrently, bounded by the total and per host concurrency limits. Leaves sharing a
+        storage path, e.g. the leaves of previous scrappings of the site, are the same page: it is scrapped once
+        and the outcome is applied to all of them. Leaves of failed pages are not updated in the graph, so they
+        keep the state of their last successful scrapping.
+        """
+        pages = {}
+        for leaf in leaves:
+            pages.setdefault(leaf.storage_path, []).append(leaf)
+
+        result = WebSiteScrappingResult(site_name=site_name, total=len(pages))
+        max_workers = max(1, self.configuration.max_concurrency)
+        log_interval = max(1, self.configuration.progress_log_interval)
+        started_at = time.perf_counter()
+
+        # Scrapped leaves are written to the graph in batches, once per progress log
+        pending_updates = []
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrapper') as executor:
+            futures = {executor.submit(self.scrap_page, page_leaves[0]): page_leaves for page_leaves in pages.values()}
+            for future in as_completed(futures):
+                page_leaves = futures[future]
+                leaf = page_leaves[0]
+                try:
+                    future.result()
+                    result.succeeded += 1
+                    if not leaf.is_changed:
+                        result.unchanged += 1
+
+                    for duplicate in page_leaves[1:]:
+                        duplicate.is_changed = leaf.is_changed
+                        duplicate.content_hash = leaf.content_hash
+                    pending_updates.extend(page_leaves)
+                except Exception as e:
+                    result.failed += 1
+                    result.failed_urls.append(leaf.url)
+                    self.logger.error(f'Failed to scrap the {leaf.url} page: {e}')
+
+                completed = result.succeeded + result.failed
+                if completed % log_interval == 0 or completed == result.total:
+                    if pending_updates:
+                        self.graph.update_nodes(nodes=pending_updates)
+                    pending_updates = []
+                    elapsed = time.perf_counter() - started_at
+                    self.logger.info(f'Scrapped {completed}/{result.total} pages of {site_name} '
+                                     f'({completed / elapsed:.2f} pages/sec)')
+
+        result.elapsed_seconds = time.perf_counter() - started_at
+        if result.elapsed_seconds > 0:
+            result.pages_per_second = result.total / result.elapsed_seconds
+
+        self.logger.info(f'Scrapping of {site_name} finished: {result.succeeded} succeeded '
+                         f'({result.unchanged} unchanged), {result.failed} failed '
+                         f'in {result.elapsed_seconds:.1f}s ({result.pages_per_second:.2f} pages/sec)')
+        return result
+
+    def scrap_page(self, leaf: DocumentNode):
+        """
+        Scraps a single leaf, retrying failed attempts with an exponential backoff. Pages which did not change
+        since the previous scrapping are not rendered again and are marked as unchanged on the leaf.
+        """
+        page_scrapping_request = WebPageScrappingRequest(
+            url=leaf.url,
+            output_file_path=leaf.storage_path
+        )
+        host_semaphore = self.__get_host_semaphore(url=leaf.url)
+        max_retries = max(0, self.configuration.max_retries)
+
+        for attempt in range(max_retries + 1):
+            try:
+                with host_semaphore:
+                    revalidation = None
+                    if self.configuration.http_cache_enabled:
+                        revalidation = self.http_cache.revalidate(url=leaf.url)
+                        if not revalidation.is_changed and Path(leaf.storage_path).exists():
+                            leaf.content_hash = revalidation.entry.content_hash
+                            leaf.is_changed = False
+                            return
+
+                    self.scrapper.scrap(request=page_scrapping_request)
+
+                # The leaf is only updated once the page was rendered, a failed page keeps its previous state
+                leaf.is_changed = True
+                if revalidation:
+                    leaf.content_hash = revalidation.entry.content_hash
+                    self.http_cache.store(entry=revalidation.entry)
+                return
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+
+                delay = self.configuration.retry_backoff_seconds * (2 ** attempt)
+                self.logger.warning(f'Scrapping of {leaf.url} failed (attempt {attempt + 1}/{max_retries + 1}), '
+                                    f'retrying in {delay:.1f}s: {e}')
+                time.sleep(delay)
+
+    def __get_host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self.host_semaphores_lock:
+            if host not in self.host_semaphores:
+                limit = max(1, self.configuration.max_concurrency_per_host)
+                self.host_semaphores[host] = threading.BoundedSemaphore(limit)
+            return self.host_semaphores[host]
 
     def get_links(self, url: str, url_filter: IUrlFilter = None, persist:bool=False) -> List[str]:
-        links = self.scrapper.get_links(url=url)
-        relevant_links = []
-        if url_filter:
-            for link in links:
-                if url_filter.apply(link):
-                    print(f'Skipping the {link} link')
-                else:
-                    relevant_links.append(link)
-
-        else:
-           relevant_links = links
+        relevant_links = self.crawler.crawl(url=url, url_filter=url_filter)
 
         relevant_links_str = ''
         for link in relevant_links:
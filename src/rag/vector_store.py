@@ -1,26 +1,131 @@
 import os
 import re
 import uuid
+import hashlib
+from typing import List, Optional
+from pydantic import BaseModel
 
 import requests
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
 from abc import ABC, abstractmethod
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
+from pathlib import Path
 from src.infra.configuration import ChromaDBConfiguration, HuggingFaceEmbeddingConfiguration
+from src.rag.embedding_cache import CachedEmbeddings, QueryEmbeddingCache, QueryEmbeddingCacheStatistics
+from src.rag.encoding_pool import MultiProcessEmbeddings
+from src.rag.embedding_backends import resolve_embedding_model, get_embedding_model_key
 from logging import Logger
 
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+class DocumentChunk(BaseModel):
+    document_id: str
+    ordinal: int
+    text: str
+    metadata: dict = {}
+
+    @property
+    def chunk_id(self) -> str:
+        """Deterministic id derived from the document id, the chunk ordinal and the chunk content"""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f'{self.document_id}/{self.ordinal}/{content_hash(self.text)}'))
+
+class UpsertResult(BaseModel):
+    added: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+
 class IVectorStoreRetriever(ABC):
     @abstractmethod
-    def query(self, query: str, k: int = 5) -> list[dict]:
+    def query(self, query: str, k: int = 5, metadata_filter: Optional[dict] = None) -> list[dict]:
+        """Searches the k most similar chunks, restricted to the chunks matching the Chroma style metadata filter"""
+        pass
+
+    @abstractmethod
+    def embed_query(self, query: str) -> List[float]:
+        pass
+
+    @abstractmethod
+    def query_by_vector(self, vector: List[float], k: int = 5, metadata_filter: Optional[dict] = None) -> list[dict]:
+        pass
+
+    @abstractmethod
+    def get_query_embedding_statistics(self) -> QueryEmbeddingCacheStatistics:
+        pass
+
+    @abstractmethod
+    def version(self):
+        """Value that changes whenever the chunks of the vector store change"""
         pass
 
     @abstractmethod
     def embed(self, chunks):
         pass
 
+    @abstractmethod
+    def upsert(self, chunks: List[DocumentChunk], document_ids: Optional[List[str]] = None) -> UpsertResult:
+        pass
+
+
+def create_embedding_model(huggingface_embed_config: HuggingFaceEmbeddingConfiguration, logger: Logger) -> Embeddings:
+    model_name = huggingface_embed_config.model_name
+    encode_kwargs = {'normalize_embeddings': False, 'batch_size': huggingface_embed_config.encode_batch_size}
+
+    logger.info(f'Vector store is initializing hugging face embedding model: {model_name} '
+                f'({huggingface_embed_config.backend} backend).')
+    if huggingface_embed_config.encode_processes > 1:
+        model = MultiProcessEmbeddings(huggingface_embed_config=huggingface_embed_config, logger=logger)
+    else:
+        model_name_or_path, model_kwargs = resolve_embedding_model(
+            huggingface_embed_config=huggingface_embed_config,
+            logger=logger
+        )
+        model = HuggingFaceEmbeddings(
+            model_name=model_name_or_path,
+            model_kwargs=model_kwargs,
+            encode_kwargs=encode_kwargs,
+            cache_folder=huggingface_embed_config.persist_directory
+        )
+    logger.info(f'Vector store hugging face embedding model was initialized.')
+
+    if huggingface_embed_config.cache_enabled:
+        cache_path = str(Path(huggingface_embed_config.persist_directory).joinpath('embedding_cache.sqlite3'))
+        logger.info(f'Vector store is using the embedding cache at {cache_path}.')
+        model = CachedEmbeddings(
+            embeddings=model,
+            model_name=get_embedding_model_key(huggingface_embed_config),
+            cache_path=cache_path,
+            max_size_bytes=huggingface_embed_config.cache_max_size_mb * 1024 * 1024,
+            logger=logger
+        )
+
+    return model
+
+
+def create_collection_metadata(chroma_db_config: ChromaDBConfiguration) -> Optional[dict]:
+    """
+    HNSW index settings of the collection. Chroma applies them when the collection is created, so changing
+    them for an existing collection requires re-ingesting it into a new one.
+    """
+    metadata = {
+        'hnsw:space': chroma_db_config.distance_metric,
+        'hnsw:M': chroma_db_config.hnsw_m,
+        'hnsw:construction_ef': chroma_db_config.hnsw_construction_ef,
+        'hnsw:search_ef': chroma_db_config.hnsw_search_ef
+    }
+    metadata = {key: value for key, value in metadata.items() if value is not None}
+    return metadata or None
+
 
 class ChromaDbVectorStoreRetriever(IVectorStoreRetriever):
+    """
+    Vector store backed by a persisted Chroma collection. Every write through this retriever stores a new
+    version token in <persist_directory>/<collection_name>.version, which version() reads, so processes sharing
+    the collection see each other's writes without depending on the internals of Chroma.
+    """
+
     def __init__(
             self,
             chroma_db_config: ChromaDBConfiguration,
@@ -28,47 +133,104 @@ class ChromaDbVectorStoreRetriever(IVectorStoreRetriever):
             logger: Logger
     ):
         self.logger = logger
-        model_name = huggingface_embed_config.model_name
-        model_kwargs = {'device': 'cpu'}
-        encode_kwargs = {'normalize_embeddings': False}
-
-        self.logger.info(f'Vector store is initializing hugging face embedding model: {model_name}.')
-        self.model = HuggingFaceEmbeddings(
-            model_name=model_name,
-            model_kwargs=model_kwargs,
-            encode_kwargs=encode_kwargs,
-            cache_folder=huggingface_embed_config.persist_directory
+        self.model = create_embedding_model(huggingface_embed_config=huggingface_embed_config, logger=logger)
+        self.query_embedding_cache = QueryEmbeddingCache(
+            max_size=huggingface_embed_config.query_cache_size,
+            ttl_seconds=huggingface_embed_config.query_cache_ttl_seconds
         )
-        self.logger.info(f'Vector store hugging face embedding model was initialized.')
 
         collection_name = chroma_db_config.collection_name
         persist_directory = chroma_db_config.persist_directory
+        self.version_path = Path(persist_directory).joinpath(f'{collection_name}.version')
 
-        self.logger.info(f'Vector store is initializing Chroma DB.')
+        collection_metadata = create_collection_metadata(chroma_db_config=chroma_db_config)
+        self.logger.info(f'Vector store is initializing Chroma DB, collection settings: {collection_metadata}.')
         self.vector_store = Chroma(
             collection_name=collection_name,
             embedding_function=self.model,
             persist_directory=persist_directory,  # Where to save data locally, remove if not necessary
+            collection_metadata=collection_metadata
         )
         self.logger.info(f'Vector store Chroma DB was initialized.')
 
     def embed(self, chunks):
+        # Ids are derived from the content only, a text repeated in one call would be added twice under one id
+        chunks = list(dict.fromkeys(chunks))
+        if not chunks:
+            return
+
+        documents = [Document(page_content=chunk) for chunk in chunks]
+        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, content_hash(chunk))) for chunk in chunks]
+        self.vector_store.add_documents(documents=documents, ids=ids)
+        self.__bump_version()
 
-        id = 0
-        documents = []
+    def upsert(self, chunks: List[DocumentChunk], document_ids: Optional[List[str]] = None) -> UpsertResult:
+        """
+        Replaces the chunks of the documents: stale chunks of the documents are deleted and only new or changed
+        chunks are embedded and added. document_ids defaults to the documents of the chunks, and should include
+        documents left without chunks so their stale chunks are deleted too.
+        """
+        if document_ids is None:
+            document_ids = list(dict.fromkeys(chunk.document_id for chunk in chunks))
+        if not document_ids:
+            return UpsertResult()
+
+        existing = self.vector_store.get(where={'document_id': {'$in': document_ids}}, include=[])
+        existing_ids = set(existing['ids'])
+
+        new_chunks = {}
         for chunk in chunks:
-            id += 1
-            document = Document(
-                page_content=chunk,
-                id=id
-            )
-            documents.append(document)
+            if chunk.chunk_id not in existing_ids:
+                new_chunks[chunk.chunk_id] = chunk
+
+        chunk_ids = {chunk.chunk_id for chunk in chunks}
+        stale_ids = list(existing_ids - chunk_ids)
+        if stale_ids:
+            self.vector_store.delete(ids=stale_ids)
 
-        uuids = [str(uuid.uuid4()) for _ in range(len(documents))]
-        self.vector_store.add_documents(documents=documents, ids=uuids)
+        if new_chunks:
+            documents = [
+                Document(
+                    page_content=chunk.text,
+                    metadata={**chunk.metadata, 'document_id': chunk.document_id, 'chunk_ordinal': chunk.ordinal}
+                )
+                for chunk in new_chunks.values()
+            ]
+            self.vector_store.add_documents(documents=documents, ids=list(new_chunks.keys()))
+        if stale_ids or new_chunks:
+            self.__bump_version()
+
+        result = UpsertResult(added=len(new_chunks), deleted=len(stale_ids),
+                              unchanged=len(chunk_ids & existing_ids))
+        self.logger.info(f'Vector store upserted chunks of {len(document_ids)} documents: {result.added} added, '
+                         f'{result.deleted} deleted, {result.unchanged} unchanged')
+        return result
+
+    def query(self, query: str, k: int = 5, metadata_filter: Optional[dict] = None) -> list[Document]:
+        return self.query_by_vector(vector=self.embed_query(query=query), k=k, metadata_filter=metadata_filter)
+
+    def embed_query(self, query: str) -> List[float]:
+        return self.query_embedding_cache.get_or_embed(query, self.model.embed_query)
+
+    def query_by_vector(self, vector: List[float], k: int = 5, metadata_filter: Optional[dict] = None) -> list[Document]:
+        result = self.vector_store.similarity_search_by_vector_with_relevance_scores(
+            embedding=vector,
+            k=k,
+            filter=metadata_filter
+        )
+        return [r[0] for r in result]
 
+    def get_query_embedding_statistics(self) -> QueryEmbeddingCacheStatistics:
+        return self.query_embedding_cache.get_statistics()
 
+    def version(self):
+        try:
+            return self.version_path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
 
-    def query(self, query: str, k: int = 5) -> list[Document]:
-        result = self.vector_store.similarity_search_with_score(query=query, k=k)
-        return [r[0] for r in result]
\ No newline at end of file
+    def __bump_version(self):
+        # Written to a temporary file and renamed, so readers never see a partial token
+        saving_path = self.version_path.with_suffix('.saving')
+        saving_path.write_text(uuid.uuid4().hex, encoding='utf-8')
+        os.replace(saving_path, self.version_path)
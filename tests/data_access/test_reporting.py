@@ -0,0 +1,109 @@
+import json
+import logging
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.data_access.reporting import BulkReportClient
+from src.infra.configuration import ElasticsearchConfiguration
+
+logger = logging.getLogger("AppLogger")
+
+class FakeElasticsearchHandler(BaseHTTPRequestHandler):
+    """Answers the bulk API like Elasticsearch and records the indexed documents"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        documents = lines[1::2]
+        self.server.bulk_requests.append(documents)
+
+        response = {'took': 1, 'errors': False, 'items': [{'index': {'status': 201}} for _ in documents]}
+        payload = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Elastic-Product', 'Elasticsearch')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_PUT = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+class BulkReportClientTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeElasticsearchHandler)
+        self.server.bulk_requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create_client(self, **settings) -> BulkReportClient:
+        configuration = ElasticsearchConfiguration(
+            endpoint=f'http://127.0.0.1:{self.server.server_port}',
+            username='elastic',
+            password='password',
+            **settings
+        )
+        return BulkReportClient(configuration=configuration, logger=logger)
+
+    def test_flushes_full_batches_and_the_rest_on_close(self):
+        client = self.create_client(report_batch_size=2, report_flush_interval_seconds=60)
+
+        for index in range(5):
+            client.report(record={'requestId': str(index)})
+        client.close()
+
+        documents = [document for request in self.server.bulk_requests for document in request]
+        self.assertEqual([document['requestId'] for document in documents], ['0', '1', '2', '3', '4'])
+        self.assertTrue(all(len(request) <= 2 for request in self.server.bulk_requests))
+        self.assertEqual(client.get_statistics().sent, 5)
+
+    def test_flushes_after_the_interval(self):
+        client = self.create_client(report_batch_size=100, report_flush_interval_seconds=0.2)
+
+        client.report(record={'requestId': '1'})
+        for _ in range(50):
+            if self.server.bulk_requests:
+                break
+            threading.Event().wait(0.05)
+
+        self.assertEqual(self.server.bulk_requests, [[{'requestId': '1'}]])
+        client.close()
+
+    def test_drops_records_when_the_queue_is_full(self):
+        client = self.create_client(report_queue_size=1, report_batch_size=100, report_flush_interval_seconds=60)
+
+        for index in range(50):
+            client.report(record={'requestId': str(index)})
+        client.close()
+
+        statistics = client.get_statistics()
+        self.assertGreater(statistics.dropped, 0)
+        self.assertEqual(statistics.sent + statistics.dropped, 50)
+
+    def test_a_record_enqueued_while_closing_is_not_lost(self):
+        client = self.create_client(report_batch_size=10, report_flush_interval_seconds=60)
+        put_nowait = client.records.put_nowait
+
+        def put_while_closing(record):
+            # close runs between the closed check of report and the enqueueing
+            closing = threading.Thread(target=client.close)
+            closing.start()
+            closing.join(timeout=0.5)
+            put_nowait(record)
+
+        client.records.put_nowait = put_while_closing
+        client.report(record={'requestId': '1'})
+        client.close()
+        client.report(record={'requestId': '2'})
+
+        self.assertEqual(self.server.bulk_requests, [[{'requestId': '1'}]])
+        self.assertEqual(client.get_statistics().sent, 1)
+        self.assertEqual(client.get_statistics().dropped, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import threading
+import unittest
+from typing import List, Optional
+from langchain_core.documents import Document
+from src.data_access.reporting import IReportClient
+from src.inference.chatbots import (AsyncOllamaChatClient, CompletionRequest, TIME_TO_FIRST_TOKEN_SPAN,
+                                    VECTOR_SEARCH_SPAN)
+from src.infra.configuration import ChatConfiguration, OllamaConfiguration, CompletionConfiguration
+from src.infra.metrics import InMemoryHistogramSink
+
+logger = logging.getLogger("AppLogger")
+
+class FakeVectorStoreRetriever:
+    def embed_query(self, query: str) -> List[float]:
+        return [1.0, 0.0]
+
+    def version(self):
+        return None
+
+    def query_by_vector(self, vector: List[float], k: int = 5, metadata_filter: Optional[dict] = None):
+        return [Document(page_content='StateGraph compiles the graph.')]
+
+class BlockingReportClient(IReportClient):
+    """Blocks every report until released, like an unreachable Elasticsearch"""
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.records = []
+
+    def report(self, record: dict):
+        self.released.wait(timeout=5)
+        self.records.append(record)
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.messages = None
+
+    async def chat(self, model: str, messages: list, stream: bool):
+        self.messages = messages
+
+        async def stream_chunks():
+            yield {'message': {'content': 'Use '}, 'done': False}
+            yield {'message': {'content': 'compile().'}, 'done': True, 'eval_count': 2, 'eval_duration': 10 ** 8}
+        return stream_chunks()
+
+class AsyncOllamaChatClientTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.report_client = BlockingReportClient()
+        self.sut = AsyncOllamaChatClient(
+            vector_store_retriever=FakeVectorStoreRetriever(),
+            report_client=self.report_client,
+            configuration=ChatConfiguration(
+                ollama=OllamaConfiguration(host='http://localhost:11434', version='codellama:7b'),
+                completion=CompletionConfiguration(chunk_number=1, executor_workers=1)
+            ),
+            metrics_sink=InMemoryHistogramSink(),
+            logger=logger
+        )
+        self.sut.client = FakeAsyncClient()
+
+    async def asyncTearDown(self):
+        self.report_client.released.set()
+        await asyncio.gather(*self.sut.report_tasks)
+
+    async def test_streams_the_completion_while_reports_are_blocked(self):
+        request = CompletionRequest(messages=[{'role': 'user', 'content': 'How do I compile a graph?'}])
+
+        # The retrieval pool has a single thread, a report running on it would block the second request
+        for _ in range(2):
+            completion = await asyncio.wait_for(self.sut.completion_stream(request=request), timeout=2)
+            chunks = [chunk async for chunk in completion.yield_chunks()]
+
+            self.assertEqual(chunks, ['Use ', 'compile().'])
+        self.assertIn('StateGraph compiles the graph.', self.sut.client.messages[-1]['content'])
+        self.assertIn(VECTOR_SEARCH_SPAN, completion.spans)
+        self.assertIn(TIME_TO_FIRST_TOKEN_SPAN, completion.spans)
+        self.assertEqual(self.report_client.records, [])
+
+        self.report_client.released.set()
+        await asyncio.gather(*self.sut.report_tasks)
+        self.assertEqual(len(self.report_client.records), 2)
+
+    async def test_every_request_is_reported_under_its_own_id(self):
+        self.report_client.released.set()
+
+        for _ in range(2):
+            request = CompletionRequest(messages=[{'role': 'user', 'content': 'How do I compile a graph?'}])
+            completion = await asyncio.wait_for(self.sut.completion_stream(request=request), timeout=2)
+            [chunk async for chunk in completion.yield_chunks()]
+        await asyncio.gather(*self.sut.report_tasks)
+
+        self.assertEqual(len({record['requestId'] for record in self.report_client.records}), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from src.infra.metrics import InMemoryHistogramSink
+from src.inference.chatbots import (CompletionStream, TIME_TO_FIRST_TOKEN_SPAN, GENERATION_SPAN,
+                                    TOKENS_PER_SECOND)
+
+class MetricsTests(unittest.TestCase):
+    def test_histogram_percentiles(self):
+        sink = InMemoryHistogramSink(max_samples=1000)
+        for value in range(1, 101):
+            sink.record(name='latency', value=value)
+
+        summary = sink.get_summary('latency')
+
+        self.assertEqual(summary.count, 100)
+        self.assertAlmostEqual(summary.p50, 50.5)
+        self.assertAlmostEqual(summary.p99, 99.01)
+        self.assertEqual(sink.get_summary('unknown').count, 0)
+
+    def test_completion_stream_records_generation_spans(self):
+        sink = InMemoryHistogramSink()
+        stream = [
+            {'message': {'content': 'Hello'}, 'done': False},
+            {'message': {'content': ''}, 'done': True, 'eval_count': 50, 'eval_duration': 2_000_000_000}
+        ]
+        completion = CompletionStream(stream=stream, metrics_sink=sink)
+
+        self.assertEqual(''.join(completion.yield_chunks()), 'Hello')
+        self.assertEqual(completion.spans[TOKENS_PER_SECOND], 25.0)
+        self.assertLessEqual(completion.spans[TIME_TO_FIRST_TOKEN_SPAN], completion.spans[GENERATION_SPAN])
+        self.assertEqual(sink.get_summary(GENERATION_SPAN).count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from src.inference.retrieval_cache import SemanticRetrievalCache
+
+class SemanticRetrievalCacheTests(unittest.TestCase):
+    def test_returns_the_result_of_a_similar_query(self):
+        cache = SemanticRetrievalCache(max_size=2, similarity_threshold=0.95)
+        cache.put(vector=[1.0, 0.0], k=3, metadata_filter=None, version=1, vector_search_result=['a'], context='A')
+
+        self.assertEqual(cache.get(vector=[0.99, 0.05], k=3, metadata_filter=None, version=1).context, 'A')
+        self.assertIsNone(cache.get(vector=[0.7, 0.7], k=3, metadata_filter=None, version=1))
+        self.assertIsNone(cache.get(vector=[1.0, 0.0], k=3, metadata_filter={'site_name': 'x'}, version=1))
+
+    def test_version_change_invalidates_the_cache(self):
+        cache = SemanticRetrievalCache(max_size=2, similarity_threshold=0.95)
+        cache.put(vector=[1.0, 0.0], k=3, metadata_filter=None, version=1, vector_search_result=['a'], context='A')
+
+        self.assertIsNone(cache.get(vector=[1.0, 0.0], k=3, metadata_filter=None, version=2))
+        self.assertEqual(cache.get_statistics().invalidations, 1)
+
+    def test_evicts_the_least_recently_used_entry(self):
+        cache = SemanticRetrievalCache(max_size=2, similarity_threshold=0.95)
+        cache.put(vector=[1.0, 0.0, 0.0], k=3, metadata_filter=None, version=1, vector_search_result=[], context='A')
+        cache.put(vector=[0.0, 1.0, 0.0], k=3, metadata_filter=None, version=1, vector_search_result=[], context='B')
+        cache.get(vector=[1.0, 0.0, 0.0], k=3, metadata_filter=None, version=1)
+        cache.put(vector=[0.0, 0.0, 1.0], k=3, metadata_filter=None, version=1, vector_search_result=[], context='C')
+
+        self.assertIsNotNone(cache.get(vector=[1.0, 0.0, 0.0], k=3, metadata_filter=None, version=1))
+        self.assertIsNone(cache.get(vector=[0.0, 1.0, 0.0], k=3, metadata_filter=None, version=1))
+        self.assertEqual(cache.get_statistics().evictions, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import logging
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from src.infra.configuration import ScrappingConfiguration
+from src.rag.crawling import IUrlFilter, WebCrawler, normalize_url
+
+SITE_PAGES = {
+    'index.html': '<a href="a/">A</a> <a href="a">A again</a> <a href="/b.html?x=1">B</a> '
+                  '<a href="b.html?x=2#top">B again</a> <a href="skip/">Skip</a> '
+                  '<a href="https://external.example/">External</a> <a href="mailto:me@example.com">Mail</a>',
+    'a/index.html': '<a href="../c.html">C</a> <a href="a1.html">A1</a> <a href="../skip/">Skip</a>',
+    'b.html': '<a href="./">Home</a>',
+    'c.html': '<a href="d.html">D</a>',
+    'a/a1.html': '<a href="../d.html">D</a>',
+    'skip/index.html': '<a href="../e.html">E</a>',
+}
+
+class SkipUrlFilter(IUrlFilter):
+    def apply(self, url: str) -> bool:
+        return '/skip' in url
+
+class RecordingRequestHandler(SimpleHTTPRequestHandler):
+    requested_paths = []
+
+    def do_GET(self):
+        self.requested_paths.append(self.path)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+class CrawlingTests(unittest.TestCase):
+    def setUp(self):
+        self.site_directory = tempfile.TemporaryDirectory()
+        for page, content in SITE_PAGES.items():
+            page_path = Path(self.site_directory.name).joinpath(page)
+            page_path.parent.mkdir(parents=True, exist_ok=True)
+            page_path.write_text(f'<html><body>{content}</body></html>')
+
+        RecordingRequestHandler.requested_paths = []
+        handler = partial(RecordingRequestHandler, directory=self.site_directory.name)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.site_url = f'http://127.0.0.1:{self.server.server_port}/'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.site_directory.cleanup()
+
+    def create_crawler(self, crawl_depth: int) -> WebCrawler:
+        configuration = ScrappingConfiguration(storage_path=self.site_directory.name, crawl_depth=crawl_depth,
+                                               max_concurrency=4)
+        return WebCrawler(configuration=configuration, logger=logging.getLogger('CrawlingTests'))
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url('HTTPS://Example.com:443//docs/page?q=1#section'), 'https://example.com/docs/page')
+        self.assertEqual(normalize_url('http://example.com:8080/a?q=1', keep_query=True), 'http://example.com:8080/a?q=1')
+        self.assertIsNone(normalize_url('mailto:me@example.com'))
+
+    def test_single_level_crawl(self):
+        links = self.create_crawler(crawl_depth=1).crawl(url=self.site_url, url_filter=SkipUrlFilter())
+
+        self.assertEqual(links, [self.site_url + 'a/', self.site_url + 'b.html', 'https://external.example/'])
+        self.assertEqual(RecordingRequestHandler.requested_paths, ['/'])
+
+    def test_multi_level_crawl(self):
+        links = self.create_crawler(crawl_depth=2).crawl(url=self.site_url, url_filter=SkipUrlFilter())
+
+        self.assertEqual(links, [
+            self.site_url + 'a/',
+            self.site_url + 'b.html',
+            'https://external.example/',
+            self.site_url + 'c.html',
+            self.site_url + 'a/a1.html'
+        ])
+        self.assertCountEqual(RecordingRequestHandler.requested_paths, ['/', '/a/', '/b.html'])
+
+    def test_filtered_urls_are_never_fetched(self):
+        links = self.create_crawler(crawl_depth=5).crawl(url=self.site_url, url_filter=SkipUrlFilter())
+
+        self.assertIn(self.site_url + 'd.html', links)
+        self.assertNotIn(self.site_url + 'e.html', links)
+        self.assertFalse([path for path in RecordingRequestHandler.requested_paths if 'skip' in path])
+        self.assertEqual(len(RecordingRequestHandler.requested_paths), len(set(RecordingRequestHandler.requested_paths)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List, Optional
+from src.data_access.graphs import DocumentNode
+from src.infra.configuration import EmbeddingConfiguration
+from src.rag.embedding import DocumentEmbedder, EmbeddingRequest
+from src.rag.vector_store import DocumentChunk, UpsertResult
+
+logger = logging.getLogger("AppLogger")
+
+class FakeGraph:
+    def __init__(self, documents: dict):
+        self.documents = documents
+
+    def get_document_node_by_id(self, document_id: str) -> Optional[DocumentNode]:
+        return self.documents.get(document_id)
+
+class FakeRetriever:
+    """Adds every chunk, failing the upserts that include the document in failing_document_id"""
+
+    def __init__(self, failing_document_id: str):
+        self.failing_document_id = failing_document_id
+        self.upserted_document_ids = []
+
+    def upsert(self, chunks: List[DocumentChunk], document_ids: Optional[List[str]] = None) -> UpsertResult:
+        if self.failing_document_id in document_ids:
+            raise IOError(f'Unable to upsert {self.failing_document_id}')
+        self.upserted_document_ids.extend(document_ids)
+        return UpsertResult(added=len(chunks))
+
+class EmbedManyTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        documents = {}
+        for document_id, paragraphs in [('a', 1), ('b', 1), ('c', 3)]:
+            parsing_storage_path = Path(self.directory.name).joinpath(f'{document_id}.md')
+            content = '\n'.join(f'## Section {paragraph}\n' + 'word ' * 30 for paragraph in range(paragraphs))
+            parsing_storage_path.write_text(content, encoding='utf-8')
+            documents[document_id] = DocumentNode(id=document_id, site_name='site',
+                                                  parsing_storage_path=str(parsing_storage_path))
+        self.retriever = FakeRetriever(failing_document_id='b')
+        self.embedder = DocumentEmbedder(
+            graph=FakeGraph(documents=documents),
+            vector_store_retriever=self.retriever,
+            configuration=EmbeddingConfiguration(chunk_size=200, chunk_overlap=0, batch_size=2),
+            logger=logger
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_a_failing_document_is_left_out_of_its_batch(self):
+        summary = self.embedder.embed_many([EmbeddingRequest(document_id=document_id) for document_id in 'abc'])
+
+        self.assertEqual(self.retriever.upserted_document_ids, ['a', 'c'])
+        self.assertEqual(summary.documents, 2)
+        self.assertEqual(summary.failed, 1)
+        self.assertEqual(list(summary.errors), ['b'])
+        self.assertIn('Unable to upsert b', summary.errors['b'])
+        self.assertEqual(summary.chunks, 4)
+        self.assertEqual(summary.added, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import logging
+import unittest
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from src.infra.configuration import HuggingFaceEmbeddingConfiguration
+from src.rag.embedding_backends import resolve_embedding_model
+import dotenv
+
+dotenv.load_dotenv()
+logger = logging.getLogger("AppLogger")
+
+SENTENCES = [
+    'QUESTION: How do I add memory to a LangGraph agent?',
+    'StateGraph compiles the nodes and edges of a graph into a runnable application.',
+    'Use a checkpointer such as MemorySaver to persist the state of a thread between invocations.',
+    '```python\ngraph.add_edge(START, "agent")\n```'
+]
+
+class EmbeddingBackendTests(unittest.TestCase):
+    MINIMUM_COSINE_SIMILARITY = {None: 0.999, 'avx2': 0.98}
+
+    def encode(self, configuration: HuggingFaceEmbeddingConfiguration) -> np.ndarray:
+        model_name_or_path, model_kwargs = resolve_embedding_model(huggingface_embed_config=configuration,
+                                                                   logger=logger)
+        model = SentenceTransformer(model_name_or_path, cache_folder=configuration.persist_directory, **model_kwargs)
+        return model.encode(SENTENCES, normalize_embeddings=True)
+
+    def test_onnx_embeddings_match_the_reference(self):
+        persist_directory = os.environ['HUGGINGFACE_MODELS_STORAGE_PATH']
+        model_name = 'sentence-transformers/all-mpnet-base-v2'
+        reference = self.encode(HuggingFaceEmbeddingConfiguration(model_name=model_name,
+                                                                   persist_directory=persist_directory))
+
+        for quantization, minimum_similarity in self.MINIMUM_COSINE_SIMILARITY.items():
+            embeddings = self.encode(HuggingFaceEmbeddingConfiguration(
+                model_name=model_name,
+                persist_directory=persist_directory,
+                backend='onnx',
+                onnx_quantization=quantization
+            ))
+
+            similarities = (reference * embeddings).sum(axis=1)
+            self.assertGreaterEqual(similarities.min(), minimum_similarity, f'onnx quantization {quantization}')
+
+
+if __name__ == '__main__':
+    unittest.main()
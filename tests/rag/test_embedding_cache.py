@@ -0,0 +1,94 @@
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from langchain_core.embeddings import Embeddings
+from src.rag.embedding_cache import CachedEmbeddings
+
+logger = logging.getLogger("AppLogger")
+
+class FakeEmbeddings(Embeddings):
+    """Embeds a text as 4 floats and records the texts it was asked to embed"""
+
+    def __init__(self, on_embed=None):
+        self.embedded_texts = []
+        self.on_embed = on_embed
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.on_embed is not None:
+            self.on_embed(texts)
+        self.embedded_texts.extend(texts)
+        return [[float(len(text)), 1.0, 2.0, 3.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class CachedEmbeddingsTests(unittest.TestCase):
+    # Vectors of 4 float32 values
+    ENTRY_SIZE = 16
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_path = str(Path(self.directory.name).joinpath('embedding_cache.sqlite3'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_cache(self, embeddings: Embeddings, max_size_bytes: int = 1024) -> CachedEmbeddings:
+        cache = CachedEmbeddings(embeddings=embeddings, model_name='fake', cache_path=self.cache_path,
+                                 max_size_bytes=max_size_bytes, logger=logger)
+        self.addCleanup(cache.connection.close)
+        return cache
+
+    def stored_statistics(self, cache: CachedEmbeddings) -> tuple:
+        return cache.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings').fetchone()
+
+    def test_embeds_only_the_missing_texts(self):
+        embeddings = FakeEmbeddings()
+        cache = self.create_cache(embeddings)
+
+        cache.embed_documents(['a', 'bb'])
+        vectors = cache.embed_documents(['bb', 'ccc', 'bb'])
+
+        self.assertEqual(embeddings.embedded_texts, ['a', 'bb', 'ccc'])
+        self.assertEqual([vector[0] for vector in vectors], [2.0, 3.0, 2.0])
+        statistics = cache.get_statistics()
+        self.assertEqual((statistics.hits, statistics.misses), (2, 3))
+        self.assertEqual((statistics.entries, statistics.size_bytes), (3, 3 * self.ENTRY_SIZE))
+
+    def test_replacing_an_entry_cached_meanwhile_does_not_count_it_twice(self):
+        embeddings = FakeEmbeddings()
+        cache = self.create_cache(embeddings)
+
+        def embed_concurrently(texts: List[str]):
+            # Another caller caches the same texts while the first one is embedding them
+            embeddings.on_embed = None
+            cache.embed_documents(texts)
+
+        embeddings.on_embed = embed_concurrently
+        cache.embed_documents(['a', 'bb'])
+
+        statistics = cache.get_statistics()
+        self.assertEqual((statistics.entries, statistics.size_bytes), self.stored_statistics(cache))
+        self.assertEqual(statistics.entries, 2)
+
+    def test_evicts_the_least_recently_used_entries_beyond_the_size_limit(self):
+        embeddings = FakeEmbeddings()
+        cache = self.create_cache(embeddings, max_size_bytes=4 * self.ENTRY_SIZE)
+
+        for text in ['a', 'b', 'c', 'd']:
+            cache.embed_documents([text])
+        cache.embed_documents(['a'])
+        cache.embed_documents(['e'])
+
+        statistics = cache.get_statistics()
+        self.assertEqual(statistics.evictions, 2)
+        self.assertEqual((statistics.entries, statistics.size_bytes), self.stored_statistics(cache))
+        self.assertEqual(statistics.entries, 3)
+        cache.embed_documents(['a', 'e'])
+        self.assertEqual(embeddings.embedded_texts, ['a', 'b', 'c', 'd', 'e'])
+
+
+if __name__ == '__main__':
+    unittest.main()
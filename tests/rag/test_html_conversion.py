@@ -0,0 +1,40 @@
+import unittest
+from src.rag.html_conversion import html_to_markdown
+
+PAGE = """
+<html><head><script>var analytics = 1;</script></head><body>
+<header class="md-header"><nav>Home | Docs</nav></header>
+<nav class="md-nav">Sidebar link</nav>
+<main><article>
+  <h1 id="intro">LangGraph <a class="headerlink" href="#intro">¶</a></h1>
+  <p>LangGraph builds <strong>stateful</strong> apps with <code>StateGraph</code>.</p>
+  <h2>Install</h2>
+  <div class="highlight"><pre><code class="language-python">def f(x):
+    return x
+</code></pre></div>
+  <ul><li>First</li><li>Second<ul><li>Nested</li></ul></li></ul>
+</article></main>
+<footer>Copyright</footer>
+</body></html>
+"""
+
+class HtmlConversionTests(unittest.TestCase):
+    def test_keeps_headings_and_code_blocks(self):
+        markdown = html_to_markdown(PAGE)
+
+        self.assertTrue(markdown.startswith('# LangGraph\n'))
+        self.assertIn('\n## Install\n', markdown)
+        self.assertIn('```python\ndef f(x):\n    return x\n```', markdown)
+        self.assertIn('LangGraph builds **stateful** apps with `StateGraph`.', markdown)
+        self.assertIn('- First\n- Second', markdown)
+        self.assertIn('  - Nested', markdown)
+
+    def test_strips_boilerplate(self):
+        markdown = html_to_markdown(PAGE)
+
+        for boilerplate in ['Sidebar link', 'Home | Docs', 'Copyright', 'analytics', '¶']:
+            self.assertNotIn(boilerplate, markdown)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import logging
+import tempfile
+import threading
+import unittest
+import numpy as np
+from src.rag.numpy_vector_store import NumpyVectorIndex, filter_to_sql, matches_filter
+from src.rag.quantization import VectorQuantizer
+
+logger = logging.getLogger("AppLogger")
+
+def get_chunk_ids(index: NumpyVectorIndex, rows: list) -> list:
+    return [chunk_id for chunk_id, _, _ in index.get_chunks([row for row, _ in rows])]
+
+class NumpyVectorIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.vectors = np.eye(4, dtype=np.float32)
+        self.index = NumpyVectorIndex(directory=self.directory.name, compaction_threshold=0.5, logger=logger)
+        self.index.add(
+            ids=['a', 'b', 'c', 'd'],
+            texts=['A', 'B', 'C', 'D'],
+            metadatas=[{'site_name': 'x'}, {'site_name': 'x'}, {'site_name': 'y'}, {'site_name': 'y'}],
+            vectors=self.vectors
+        )
+        self.index.save()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_search_returns_the_most_similar_rows(self):
+        query = np.array([0.1, 0.9, 0.3, 0.0], dtype=np.float32)
+
+        rows = self.index.search(query_vector=query, k=2)
+
+        self.assertEqual(get_chunk_ids(self.index, rows), ['b', 'c'])
+
+    def test_search_is_restricted_to_filtered_rows(self):
+        query = np.array([0.1, 0.9, 0.3, 0.0], dtype=np.float32)
+
+        rows = self.index.search(query_vector=query, k=2, rows=self.index.find_rows({'site_name': 'y'}))
+
+        self.assertEqual(get_chunk_ids(self.index, rows), ['c', 'd'])
+
+    def test_deleted_rows_survive_reopening(self):
+        self.index.delete(ids=['b'])
+        self.index.save()
+
+        index = NumpyVectorIndex(directory=self.directory.name, compaction_threshold=0.5, logger=logger)
+        rows = index.search(query_vector=self.vectors[1], k=4)
+
+        self.assertEqual(sorted(get_chunk_ids(index, rows)), ['a', 'c', 'd'])
+
+    def test_stale_reader_keeps_its_rows_across_a_compaction(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        vectors = np.random.default_rng(0).normal(size=(100, 8)).astype(np.float32)
+        writer = NumpyVectorIndex(directory=directory.name, compaction_threshold=0.2, logger=logger)
+        writer.add(ids=[str(row) for row in range(100)], texts=[str(row) for row in range(100)],
+                   metadatas=[{} for _ in range(100)], vectors=vectors)
+        writer.save()
+        reader = NumpyVectorIndex(directory=directory.name, compaction_threshold=0.2, logger=logger)
+
+        writer.delete(ids=[str(row) for row in range(50)])
+        writer.save()
+
+        self.assertEqual(writer.count, 50)
+        rows = reader.search(query_vector=vectors[75], k=1)
+        self.assertEqual(reader.get_chunks([rows[0][0]])[0][1], '75')
+        reader.reload_if_changed()
+        rows = reader.search(query_vector=vectors[75], k=1)
+        self.assertEqual(reader.get_chunks([rows[0][0]])[0][1], '75')
+        self.assertEqual(reader.count, 50)
+
+    def test_concurrent_queries_survive_reloads_of_a_compacted_index(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        vectors = np.random.default_rng(0).normal(size=(200, 8)).astype(np.float32)
+        writer = NumpyVectorIndex(directory=directory.name, compaction_threshold=0.2, logger=logger)
+        writer.add(ids=[str(row) for row in range(200)], texts=[str(row) for row in range(200)],
+                   metadatas=[{} for _ in range(200)], vectors=vectors)
+        writer.save()
+        reader = NumpyVectorIndex(directory=directory.name, compaction_threshold=0.2, logger=logger)
+        errors = []
+
+        def query_rows():
+            try:
+                for _ in range(200):
+                    row = int(np.random.default_rng().integers(200))
+                    results = reader.query(query_vector=vectors[row], k=1)
+                    if results and results[0][0] != results[0][1]:
+                        errors.append(f'{results[0][0]} returned the text of {results[0][1]}')
+            except Exception as e:
+                errors.append(repr(e))
+
+        threads = [threading.Thread(target=query_rows) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for start in range(0, 150, 10):
+            # Replacing rows with new ones compacts the index every few saves
+            ids = [str(row) for row in range(start, start + 10)]
+            writer.add(ids=ids, texts=ids, metadatas=[{} for _ in ids], vectors=vectors[start:start + 10])
+            writer.save()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+    def test_quantized_search_matches_the_exact_search(self):
+        for storage_type, pca_dimension in [('float16', None), ('int8', None), ('int8', 3)]:
+            index = NumpyVectorIndex(
+                directory=self.directory.name,
+                compaction_threshold=0.5,
+                logger=logger,
+                quantizer=VectorQuantizer(storage_type=storage_type, pca_dimension=pca_dimension),
+                rescore_candidates=3
+            )
+            query = np.array([0.1, 0.9, 0.3, 0.0], dtype=np.float32)
+
+            rows = index.search(query_vector=query, k=2)
+
+            self.assertEqual(get_chunk_ids(index, rows), ['b', 'c'])
+
+    def test_appended_rows_are_encoded_without_refitting_the_quantizer(self):
+        quantizer = VectorQuantizer(storage_type='int8')
+        index = NumpyVectorIndex(directory=self.directory.name, compaction_threshold=0.5, logger=logger,
+                                 quantizer=quantizer)
+        index.search(query_vector=self.vectors[0], k=1)
+        minimum = quantizer.minimum
+
+        index.add(ids=['e'], texts=['E'], metadatas=[{}], vectors=np.array([[0.0, 0.6, 0.8, 0.0]], dtype=np.float32))
+        rows = index.search(query_vector=np.array([0.0, 0.6, 0.8, 0.0], dtype=np.float32), k=1)
+
+        self.assertEqual(index.get_chunks([rows[0][0]])[0][0], 'e')
+        self.assertIs(quantizer.minimum, minimum)
+        self.assertEqual(len(index.codes), 5)
+
+    def test_matches_filter(self):
+        metadata = {'site_name': 'x', 'document_id': '1'}
+
+        self.assertTrue(matches_filter(metadata, {'$and': [{'site_name': 'x'}, {'document_id': {'$in': ['1', '2']}}]}))
+        self.assertFalse(matches_filter(metadata, {'$or': [{'site_name': 'y'}, {'document_id': {'$ne': '1'}}]}))
+
+    def test_filter_to_sql_agrees_with_matches_filter(self):
+        metadatas = [{'site_name': 'x', 'document_id': '1', 'page': 1}, {'site_name': 'x', 'document_id': '2'},
+                     {'site_name': 'y', 'document_id': '3', 'page': 3}, {'site.name': 'z'}]
+        index = NumpyVectorIndex(directory=tempfile.mkdtemp(dir=self.directory.name), compaction_threshold=0.5,
+                                 logger=logger)
+        index.add(ids=['a', 'b', 'c', 'd'], texts=['A', 'B', 'C', 'D'], metadatas=metadatas, vectors=self.vectors)
+        filters = [
+            {'site_name': 'x'},
+            {'site.name': 'z'},
+            {'document_id': {'$in': ['1', '3']}},
+            {'document_id': {'$nin': ['1']}},
+            {'document_id': {'$in': []}},
+            {'page': {'$gte': 2}},
+            {'page': {'$lt': 2}},
+            {'site_name': {'$ne': 'x'}},
+            {'$or': [{'site_name': 'y'}, {'document_id': '2'}]},
+            {'$and': [{'site_name': 'x'}, {'document_id': {'$in': ['1', '2']}}, {'page': {'$lte': 1}}]},
+        ]
+
+        for metadata_filter in filters:
+            expected = [row for row, metadata in enumerate(metadatas) if matches_filter(metadata, metadata_filter)]
+            self.assertEqual(index.find_rows(metadata_filter).tolist(), expected, metadata_filter)
+        with self.assertRaises(ValueError):
+            filter_to_sql({'page': {'$exists': True}})
+
+    def test_readding_an_id_replaces_its_row(self):
+        self.index.add(ids=['b', 'e', 'e'], texts=['B2', 'E1', 'E2'],
+                       metadatas=[{'document_id': '1'}, {'document_id': '1'}, {'document_id': '1'}],
+                       vectors=np.ones((3, 4), dtype=np.float32))
+        self.index.save()
+
+        index = NumpyVectorIndex(directory=self.directory.name, compaction_threshold=0.9, logger=logger)
+        rows = index.search(query_vector=np.ones(4, dtype=np.float32), k=10)
+
+        self.assertEqual(sorted(text for _, text, _ in index.get_chunks([row for row, _ in rows])),
+                         ['A', 'B2', 'C', 'D', 'E2'])
+        self.assertEqual(index.get_document_chunk_ids(['1', '2']), {'b', 'e'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Optional
+from src.data_access.graphs import DocumentNode
+from src.infra.configuration import ParsingConfiguration
+from src.rag.parsing import HtmlDocumentParser, ParsingRequest
+
+class FakeGraph:
+    """Serves the documents it was given and records the process every update runs in"""
+
+    def __init__(self, documents: dict):
+        self.documents = documents
+        self.updates = []
+
+    def get_document_node_by_id(self, document_id: str) -> Optional[DocumentNode]:
+        document = self.documents.get(document_id)
+        return document.model_copy() if document is not None else None
+
+    def get_leaf_path(self, leaf_id: str, site_name: str) -> str:
+        return f'{site_name}/{leaf_id}'
+
+    def update_node(self, node: DocumentNode):
+        self.updates.append((node.id, os.getpid()))
+
+class ParseManyTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        documents = {}
+        for document_id in ['a', 'b', 'c']:
+            storage_path = Path(self.directory.name).joinpath(f'{document_id}.html')
+            html = f'<html><body><h1>Page {document_id}</h1><p>Text of {document_id}</p></body></html>'
+            storage_path.write_text(html, encoding='utf-8')
+            documents[document_id] = DocumentNode(id=document_id, site_name='site', storage_path=str(storage_path))
+        documents['missing-file'] = DocumentNode(id='missing-file', site_name='site',
+                                                 storage_path=str(Path(self.directory.name).joinpath('missing.html')))
+        self.graph = FakeGraph(documents=documents)
+        self.parser = HtmlDocumentParser(
+            graph=self.graph,
+            configuration=ParsingConfiguration(storage_path=self.directory.name, parser_type='html', max_workers=2)
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_many_reports_every_document(self):
+        document_ids = ['a', 'missing-document', 'b', 'missing-file', 'c']
+
+        results = {result.document_id: result
+                   for result in self.parser.parse_many([ParsingRequest(document_id=document_id)
+                                                         for document_id in document_ids])}
+
+        self.assertEqual(sorted(results), sorted(document_ids))
+        for document_id in ['a', 'b', 'c']:
+            result = results[document_id]
+            self.assertTrue(result.is_success, result.error)
+            markdown = Path(result.parsing_storage_path).read_text(encoding='utf-8')
+            self.assertIn(f'Text of {document_id}', markdown)
+            self.assertEqual(result.characters, len(markdown))
+        self.assertIn('Document was not found', results['missing-document'].error)
+        self.assertFalse(results['missing-file'].is_success)
+
+    def test_parse_many_updates_the_graph_in_the_calling_process_only(self):
+        document_ids = ['a', 'b', 'missing-file', 'c']
+
+        list(self.parser.parse_many([ParsingRequest(document_id=document_id) for document_id in document_ids]))
+
+        self.assertEqual(sorted(document_id for document_id, _ in self.graph.updates), ['a', 'b', 'c'])
+        self.assertEqual({pid for _, pid in self.graph.updates}, {os.getpid()})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import logging
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from src.infra.configuration import ScrappingConfiguration
+from src.rag.rendering import WkhtmltopdfRendererPool
+
+logger = logging.getLogger("AppLogger")
+
+# Stands in for wkhtmltopdf --read-args-from-stdin: every line is a job, the url tells it to hang, to exit or to
+# write its process id to the output file
+FAKE_WKHTMLTOPDF = f"""#!{sys.executable}
+import os
+import shlex
+import sys
+import time
+
+for line in sys.stdin:
+    url, output_file_path = shlex.split(line)
+    if url == 'https://example.com/hang':
+        time.sleep(60)
+    elif url == 'https://example.com/exit':
+        sys.exit(1)
+    with open(output_file_path, 'w') as file:
+        file.write(str(os.getpid()))
+    sys.stderr.write('Done\\n')
+    sys.stderr.flush()
+"""
+
+class WkhtmltopdfRendererPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        executable = Path(self.directory.name).joinpath('wkhtmltopdf')
+        executable.write_text(FAKE_WKHTMLTOPDF, encoding='utf-8')
+        executable.chmod(executable.stat().st_mode | stat.S_IEXEC)
+        self.pool = WkhtmltopdfRendererPool(
+            configuration=ScrappingConfiguration(
+                storage_path=self.directory.name,
+                wkhtmltopdf_path=str(executable),
+                renderer_timeout_seconds=2,
+                renderer_max_jobs_per_worker=3
+            ),
+            logger=logger
+        )
+        self.output_path = Path(self.directory.name).joinpath('page.pdf')
+
+    def tearDown(self):
+        self.pool.close()
+        self.directory.cleanup()
+
+    def render(self, url: str = 'https://example.com/page') -> str:
+        self.pool.render(url=url, output_file_path=str(self.output_path))
+        return self.output_path.read_text()
+
+    def test_pool_size_defaults_to_max_concurrency(self):
+        configuration = ScrappingConfiguration(storage_path=self.directory.name, wkhtmltopdf_path=sys.executable,
+                                               max_concurrency=3)
+
+        self.assertEqual(WkhtmltopdfRendererPool(configuration=configuration, logger=logger).workers.qsize(), 3)
+        self.assertEqual(self.pool.workers.qsize(), 1)
+
+    def test_worker_is_reused_and_recycled_after_max_jobs(self):
+        process_ids = [self.render() for _ in range(4)]
+
+        self.assertEqual(len(set(process_ids[:3])), 1)
+        self.assertNotEqual(process_ids[3], process_ids[0])
+
+    def test_timed_out_worker_is_restarted(self):
+        process_id = self.render()
+
+        with self.assertRaises(TimeoutError):
+            self.render(url='https://example.com/hang')
+
+        self.assertNotEqual(self.render(), process_id)
+        # No temporary output of the timed out job is left behind
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['page.pdf', 'wkhtmltopdf'])
+
+    def test_crashed_worker_is_restarted(self):
+        process_id = self.render()
+
+        with self.assertRaises(IOError):
+            self.render(url='https://example.com/exit')
+
+        self.assertNotEqual(self.render(), process_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
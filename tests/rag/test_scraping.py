@@ -0,0 +1,106 @@
+import logging
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from typing import List
+from src.data_access.graphs import DocumentNode
+from src.infra.configuration import ScrappingConfiguration
+from src.rag.http_cache import HttpCacheEntry, RevalidationResult
+from src.rag.scraping import IWebPageScrapper, WebPageScrappingRequest, WebsiteScrapper
+
+logger = logging.getLogger("AppLogger")
+
+class FakePageScrapper(IWebPageScrapper):
+    """Writes the url to the output file, failing for the urls in failing_urls"""
+
+    def __init__(self, failing_urls: List[str] = ()):
+        self.failing_urls = failing_urls
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def scrap(self, request: WebPageScrappingRequest):
+        with self.lock:
+            self.requests.append(request)
+        if request.url in self.failing_urls:
+            raise IOError(f'Unable to render {request.url}')
+        Path(request.output_file_path).write_text(request.url, encoding='utf-8')
+
+    def get_links(self, url: str, persist: bool = False) -> List[str]:
+        return []
+
+class FakeHttpCache:
+    """Reports every page as changed"""
+
+    def __init__(self):
+        self.stored_urls = []
+
+    def revalidate(self, url: str) -> RevalidationResult:
+        entry = HttpCacheEntry(url=url, content_hash=f'hash of {url}')
+        return RevalidationResult(url=url, is_changed=True, status_code=200, entry=entry)
+
+    def store(self, entry: HttpCacheEntry):
+        self.stored_urls.append(entry.url)
+
+class FakeGraph:
+    def __init__(self):
+        self.updated_nodes = []
+
+    def update_nodes(self, nodes: List[DocumentNode]):
+        self.updated_nodes.extend(nodes)
+
+class WebsiteScrapperTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.graph = FakeGraph()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_scrapper(self, page_scrapper: IWebPageScrapper, http_cache: FakeHttpCache = None) -> WebsiteScrapper:
+        configuration = ScrappingConfiguration(
+            storage_path=self.directory.name,
+            max_concurrency=4,
+            max_retries=1,
+            retry_backoff_seconds=0.0,
+            http_cache_enabled=http_cache is not None
+        )
+        return WebsiteScrapper(scrapper=page_scrapper, crawler=None, http_cache=http_cache, graph=self.graph,
+                               configuration=configuration, logger=logger)
+
+    def create_leaf(self, leaf_id: str, page: str) -> DocumentNode:
+        return DocumentNode(id=leaf_id, url=f'https://example.com/{page}',
+                            storage_path=str(Path(self.directory.name).joinpath(f'{page}.pdf')), is_leaf=True)
+
+    def test_leaves_of_the_same_page_are_scrapped_once(self):
+        page_scrapper = FakePageScrapper()
+        # Leaves 1 and 2 are the same page, created by two scrappings of the site
+        leaves = [self.create_leaf('1', 'a'), self.create_leaf('2', 'a'), self.create_leaf('3', 'b')]
+
+        result = self.create_scrapper(page_scrapper).scrap_pages(site_name='example', leaves=leaves)
+
+        self.assertEqual(sorted(request.url for request in page_scrapper.requests),
+                         ['https://example.com/a', 'https://example.com/b'])
+        self.assertEqual((result.total, result.succeeded, result.failed), (2, 2, 0))
+        self.assertEqual(sorted(node.id for node in self.graph.updated_nodes), ['1', '2', '3'])
+
+    def test_failed_pages_are_not_updated(self):
+        http_cache = FakeHttpCache()
+        page_scrapper = FakePageScrapper(failing_urls=['https://example.com/b'])
+        leaves = [self.create_leaf('1', 'a'), self.create_leaf('2', 'b')]
+        leaves[1].is_changed = False
+        leaves[1].content_hash = 'previous'
+        scrapper = self.create_scrapper(page_scrapper, http_cache=http_cache)
+
+        result = scrapper.scrap_pages(site_name='example', leaves=leaves)
+
+        self.assertEqual((result.succeeded, result.failed), (1, 1))
+        self.assertEqual(result.failed_urls, ['https://example.com/b'])
+        self.assertEqual([node.id for node in self.graph.updated_nodes], ['1'])
+        self.assertEqual((leaves[0].is_changed, leaves[0].content_hash), (True, 'hash of https://example.com/a'))
+        self.assertEqual(leaves[1].content_hash, 'previous')
+        self.assertEqual(http_cache.stored_urls, ['https://example.com/a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Compares the latency of the embedding model backends: query time encoding of a single sentence (p50/p95)
+and ingest time encoding of a batch of chunks (chunks/sec), for torch, ONNX and dynamically quantized ONNX.
+
+Usage: python -m tools.benchmark_embedding_backends --persist-directory <models directory>
+       [--model sentence-transformers/all-mpnet-base-v2] [--quantization avx2] [--chunks 512] [--queries 100]
+"""
+import argparse
+import logging
+import time
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from src.infra.configuration import HuggingFaceEmbeddingConfiguration
+from src.rag.embedding_backends import resolve_embedding_model
+
+logger = logging.getLogger("AppLogger")
+
+QUERY = 'QUESTION: How do I stream the tokens of a LangGraph agent response?'
+CHUNK = ('LangGraph is a library for building stateful, multi-actor applications with LLMs. Compared to other '
+         'frameworks it offers cycles, controllability and persistence. A StateGraph is parameterized by a state '
+         'object, nodes update the state and edges decide which node runs next. ') * 4
+
+def benchmark(name: str, configuration: HuggingFaceEmbeddingConfiguration, chunks: int, queries: int):
+    model_name_or_path, model_kwargs = resolve_embedding_model(huggingface_embed_config=configuration,
+                                                               logger=logger)
+    model = SentenceTransformer(model_name_or_path, cache_folder=configuration.persist_directory, **model_kwargs)
+    model.encode([QUERY])
+
+    latencies = []
+    for _ in range(queries):
+        started_at = time.perf_counter()
+        model.encode([QUERY])
+        latencies.append(time.perf_counter() - started_at)
+
+    texts = [f'{index} {CHUNK}' for index in range(chunks)]
+    started_at = time.perf_counter()
+    model.encode(texts, batch_size=configuration.encode_batch_size)
+    batch_seconds = time.perf_counter() - started_at
+
+    p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+    print(f'{name:<18} query p50 {p50:7.2f}ms, p95 {p95:7.2f}ms | batch {chunks / batch_seconds:8.1f} chunks/sec')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--persist-directory', required=True, help='Directory of the cached models')
+    parser.add_argument('--model', default='sentence-transformers/all-mpnet-base-v2')
+    parser.add_argument('--quantization', default='avx2', help='arm64, avx2, avx512 or avx512_vnni')
+    parser.add_argument('--chunks', type=int, default=512, help='Number of chunks of the batch')
+    parser.add_argument('--queries', type=int, default=100, help='Number of single sentence encodings')
+    args = parser.parse_args()
+
+    backends = [('torch', 'torch', None), ('onnx', 'onnx', None), (f'onnx {args.quantization}', 'onnx', args.quantization)]
+    for name, backend, quantization in backends:
+        configuration = HuggingFaceEmbeddingConfiguration(
+            model_name=args.model,
+            persist_directory=args.persist_directory,
+            backend=backend,
+            onnx_quantization=quantization
+        )
+        benchmark(name, configuration, args.chunks, args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compares the ingestion throughput (pages/sec) of the PDF path (wkhtmltopdf + pymupdf4llm) with the direct
+HTML to Markdown path.
+
+Usage: python -m tools.benchmark_ingestion --links <links.txt> [--pages 20]
+"""
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+import dotenv
+from src.infra.configuration import ScrappingConfiguration, ParsingConfiguration
+from src.rag.scraping import WebPageScrapper, HtmlWebPageScrapper, WebPageScrappingRequest, IWebPageScrapper
+from src.rag.parsing import DocumentParser, HtmlDocumentParser
+
+dotenv.load_dotenv()
+logger = logging.getLogger("AppLogger")
+
+def benchmark(name: str, scrapper: IWebPageScrapper, parser: DocumentParser, urls: list, output_directory: Path):
+    scrapping_seconds = 0.0
+    parsing_seconds = 0.0
+    markdown_characters = 0
+    failures = 0
+
+    for index, url in enumerate(urls):
+        output_file_path = str(output_directory.joinpath(name, f'{index}.{scrapper.file_extension}'))
+        try:
+            started_at = time.perf_counter()
+            scrapper.scrap(request=WebPageScrappingRequest(url=url, output_file_path=output_file_path))
+            scrapped_at = time.perf_counter()
+            markdown = parser.convert(document_path=output_file_path)
+            parsed_at = time.perf_counter()
+        except Exception as e:
+            failures += 1
+            logger.warning(f'{name}: failed to ingest {url}: {e}')
+            continue
+
+        scrapping_seconds += scrapped_at - started_at
+        parsing_seconds += parsed_at - scrapped_at
+        markdown_characters += len(markdown)
+
+    pages = len(urls) - failures
+    total_seconds = scrapping_seconds + parsing_seconds
+    pages_per_second = pages / total_seconds if total_seconds else 0.0
+    print(f'{name:>5}: {pages} pages ({failures} failed), scrapping {scrapping_seconds:.2f}s, '
+          f'parsing {parsing_seconds:.2f}s, {pages_per_second:.2f} pages/sec, '
+          f'{markdown_characters} markdown characters')
+    return pages_per_second
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', required=True, help='File with one url per line, e.g. the persisted links.txt')
+    parser.add_argument('--pages', type=int, default=20, help='Number of pages to ingest with each path')
+    args = parser.parse_args()
+
+    urls = [line.strip() for line in Path(args.links).read_text().splitlines() if line.strip()][:args.pages]
+
+    with tempfile.TemporaryDirectory() as storage_path:
+        scrapping_config = ScrappingConfiguration(storage_path=storage_path)
+        parsing_config = ParsingConfiguration(storage_path=storage_path)
+        output_directory = Path(storage_path)
+
+        pdf_rate = benchmark('pdf', WebPageScrapper(), DocumentParser(graph=None, configuration=parsing_config),
+                             urls, output_directory)
+        html_rate = benchmark('html', HtmlWebPageScrapper(configuration=scrapping_config),
+                              HtmlDocumentParser(graph=None, configuration=parsing_config), urls, output_directory)
+
+    if pdf_rate:
+        print(f'html path speedup: {html_rate / pdf_rate:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Compares the Chroma vector store with the in process NumPy vector index on a synthetic corpus of normalized
+embeddings: ingest time per batch (p50/p95, first and last batch), open time, query latency (p50/p95) and the
+overlap of their top-k results. Chunks are ingested the way the embedding pipeline upserts them: batches of
+chunks of ~1000 characters with their document metadata, each looking up the chunks of its documents, adding
+the new ones and saving. The embedding model is left out, both stores search the same precomputed vectors.
+
+Usage: python -m tools.benchmark_vector_store [--chunks 200000] [--dimension 768] [--queries 200] [--k 5]
+                                              [--batch-size 512] [--chunks-per-document 8]
+"""
+import argparse
+import logging
+import tempfile
+import time
+from typing import List
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+from src.rag.numpy_vector_store import NumpyVectorIndex, normalize_rows
+
+logger = logging.getLogger("AppLogger")
+
+# Chroma rejects larger add batches
+CHROMA_BATCH_SIZE = 5000
+
+# Size of the chunks of the embedding pipeline
+CHUNK_SIZE = 1000
+
+WORDS = ['vector', 'index', 'document', 'page', 'site', 'query', 'search', 'chunk', 'embedding', 'model']
+
+class PrecomputedEmbeddings(Embeddings):
+    """Looks up the vector of a text by the row number it starts with"""
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[int(text.split(' ', 1)[0])].tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def create_batch(start: int, stop: int, chunks_per_document: int) -> tuple:
+    ids = [str(row) for row in range(start, stop)]
+    texts = [create_text(row) for row in range(start, stop)]
+    metadatas = [{
+        'document_id': str(row // chunks_per_document),
+        'site_name': f'site {row // chunks_per_document % 10}',
+        'url': f'https://example.com/{row // chunks_per_document}',
+        'chunk_ordinal': row % chunks_per_document,
+    } for row in range(start, stop)]
+    return ids, texts, metadatas
+
+def create_text(row: int) -> str:
+    text = f'{row} ' + ' '.join(WORDS[(row + offset) % len(WORDS)] for offset in range(CHUNK_SIZE // 5))
+    return text[:CHUNK_SIZE]
+
+def percentiles(latencies: list) -> str:
+    p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+    return f'p50 {p50:.2f}ms, p95 {p95:.2f}ms'
+
+def print_ingest(name: str, latencies: list):
+    print(f'{name}: ingested in {sum(latencies):.2f}s, batch {percentiles(latencies)}, '
+          f'first batch {latencies[0] * 1000:.2f}ms, last batch {latencies[-1] * 1000:.2f}ms')
+
+def benchmark_numpy(directory: str, vectors: np.ndarray, queries: np.ndarray, k: int, batch_size: int,
+                    chunks_per_document: int):
+    index = NumpyVectorIndex(directory=directory, compaction_threshold=0.2, logger=logger)
+    latencies = []
+    for start in range(0, len(vectors), batch_size):
+        stop = min(start + batch_size, len(vectors))
+        ids, texts, metadatas = create_batch(start, stop, chunks_per_document)
+        started_at = time.perf_counter()
+        # Same steps as NumpyVectorStoreRetriever.upsert, without the embedding model
+        index.reload_if_changed()
+        index.get_document_chunk_ids(list(dict.fromkeys(metadata['document_id'] for metadata in metadatas)))
+        index.add(ids=ids, texts=texts, metadatas=metadatas, vectors=vectors[start:stop])
+        index.save()
+        latencies.append(time.perf_counter() - started_at)
+    print_ingest('numpy', latencies)
+
+    started_at = time.perf_counter()
+    index = NumpyVectorIndex(directory=directory, compaction_threshold=0.2, logger=logger)
+    print(f'numpy: opened in {(time.perf_counter() - started_at) * 1000:.1f}ms')
+
+    results = []
+    latencies = []
+    for query in queries:
+        started_at = time.perf_counter()
+        rows = index.search(query_vector=query, k=k)
+        latencies.append(time.perf_counter() - started_at)
+        results.append({chunk_id for chunk_id, _, _ in index.get_chunks([row for row, _ in rows])})
+    print(f'numpy: query {percentiles(latencies)}')
+    return results
+
+def benchmark_chroma(directory: str, vectors: np.ndarray, queries: np.ndarray, k: int, batch_size: int,
+                     chunks_per_document: int):
+    embeddings = PrecomputedEmbeddings(vectors=vectors)
+    vector_store = Chroma(collection_name='benchmark', embedding_function=embeddings, persist_directory=directory)
+    latencies = []
+    for start in range(0, len(vectors), batch_size):
+        stop = min(start + batch_size, len(vectors))
+        ids, texts, metadatas = create_batch(start, stop, chunks_per_document)
+        started_at = time.perf_counter()
+        document_ids = list(dict.fromkeys(metadata['document_id'] for metadata in metadatas))
+        vector_store.get(where={'document_id': {'$in': document_ids}}, include=[])
+        vector_store.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+        latencies.append(time.perf_counter() - started_at)
+    print_ingest('chroma', latencies)
+
+    started_at = time.perf_counter()
+    vector_store = Chroma(collection_name='benchmark', embedding_function=embeddings, persist_directory=directory)
+    vector_store.similarity_search_by_vector(embedding=queries[0].tolist(), k=k)
+    print(f'chroma: opened in {(time.perf_counter() - started_at) * 1000:.1f}ms (including a first query)')
+
+    results = []
+    latencies = []
+    for query in queries:
+        started_at = time.perf_counter()
+        documents = vector_store.similarity_search_by_vector(embedding=query.tolist(), k=k)
+        latencies.append(time.perf_counter() - started_at)
+        results.append({document.id for document in documents})
+    print(f'chroma: query {percentiles(latencies)}')
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=200000, help='Number of vectors in the corpus')
+    parser.add_argument('--dimension', type=int, default=768, help='Embedding dimension')
+    parser.add_argument('--queries', type=int, default=200, help='Number of queries to time')
+    parser.add_argument('--k', type=int, default=5, help='Number of results per query')
+    parser.add_argument('--batch-size', type=int, default=512, help='Number of chunks upserted per batch')
+    parser.add_argument('--chunks-per-document', type=int, default=8, help='Number of chunks of a document')
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    vectors = normalize_rows(generator.standard_normal((args.chunks, args.dimension), dtype=np.float32))
+    queries = normalize_rows(generator.standard_normal((args.queries, args.dimension), dtype=np.float32))
+
+    with tempfile.TemporaryDirectory() as numpy_directory, tempfile.TemporaryDirectory() as chroma_directory:
+        numpy_results = benchmark_numpy(numpy_directory, vectors, queries, args.k, args.batch_size,
+                                        args.chunks_per_document)
+        chroma_results = benchmark_chroma(chroma_directory, vectors, queries, args.k, args.batch_size,
+                                          args.chunks_per_document)
+
+    overlap = np.mean([len(a & b) / args.k for a, b in zip(numpy_results, chroma_results)])
+    print(f'top-{args.k} overlap of chroma with the exact numpy search: {overlap:.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Reports recall@k, memory and query latency of the compressed vector storage options of the NumPy vector index
+against the exact float32 search. Runs on a persisted index (e.g. <numpy_index.persist_directory>/<collection>)
+or on a synthetic corpus. Queries are corpus rows sampled at random, perturbed with Gaussian noise.
+
+Configurations are written as <storage_type>[:pca=<dimension>][:rescore=<candidates>].
+
+Usage: python -m tools.report_quantization [--index <directory>] [--k 10] [--queries 200]
+       [--configurations float16 int8 int8:rescore=50 float32:pca=256 int8:pca=256:rescore=100]
+"""
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from src.rag.numpy_vector_store import NumpyVectorIndex, normalize_rows
+from src.rag.quantization import VectorQuantizer
+
+logger = logging.getLogger("AppLogger")
+
+DEFAULT_CONFIGURATIONS = ['float16', 'int8', 'int8:rescore=50', 'float32:pca=256', 'float32:pca=256:rescore=50',
+                          'int8:pca=256:rescore=100']
+
+def parse_configuration(configuration: str) -> dict:
+    storage_type, *options = configuration.split(':')
+    parsed = {'storage_type': storage_type, 'pca_dimension': None, 'rescore_candidates': 0}
+    for option in options:
+        key, value = option.split('=')
+        parsed['pca_dimension' if key == 'pca' else 'rescore_candidates'] = int(value)
+    return parsed
+
+def create_synthetic_index(directory: str, chunks: int, dimension: int) -> NumpyVectorIndex:
+    # Embeddings of a corpus concentrate around a low dimensional subspace, pure noise would not
+    generator = np.random.default_rng(0)
+    basis = generator.standard_normal((64, dimension), dtype=np.float32)
+    vectors = generator.standard_normal((chunks, 64), dtype=np.float32) @ basis
+    vectors += 0.5 * generator.standard_normal((chunks, dimension), dtype=np.float32)
+
+    index = NumpyVectorIndex(directory=directory, compaction_threshold=0.2, logger=logger)
+    index.add(ids=[str(row) for row in range(chunks)], texts=[''] * chunks, metadatas=[{}] * chunks,
+              vectors=normalize_rows(vectors))
+    index.save()
+    return index
+
+def run_queries(index: NumpyVectorIndex, queries: np.ndarray, k: int):
+    results = []
+    latencies = []
+    for query in queries:
+        started_at = time.perf_counter()
+        rows = index.search(query_vector=query, k=k)
+        latencies.append(time.perf_counter() - started_at)
+        results.append({row for row, _ in rows})
+    return results, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--index', help='Directory of a persisted NumPy vector index, a copy of it is used')
+    parser.add_argument('--chunks', type=int, default=100000, help='Size of the synthetic corpus')
+    parser.add_argument('--dimension', type=int, default=768, help='Dimension of the synthetic corpus')
+    parser.add_argument('--queries', type=int, default=200, help='Number of queries')
+    parser.add_argument('--query-noise', type=float, default=0.5, help='Standard deviation of the query noise')
+    parser.add_argument('--k', type=int, default=10, help='Number of results per query')
+    parser.add_argument('--configurations', nargs='+', default=DEFAULT_CONFIGURATIONS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.index:
+            shutil.copytree(args.index, directory, dirs_exist_ok=True)
+            exact_index = NumpyVectorIndex(directory=directory, compaction_threshold=1.0, logger=logger)
+        else:
+            exact_index = create_synthetic_index(directory, args.chunks, args.dimension)
+
+        live_rows = np.flatnonzero(~exact_index.deleted)
+        generator = np.random.default_rng(1)
+        query_rows = np.sort(generator.choice(live_rows, size=min(args.queries, len(live_rows)), replace=False))
+        queries = np.array(exact_index.vectors[query_rows])
+        queries += args.query_noise * generator.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(
+            exact_index.dimension)
+
+        exact_results, latencies = run_queries(exact_index, queries, args.k)
+        print(f'{len(live_rows)} rows of dimension {exact_index.dimension}, {len(queries)} queries, k={args.k}')
+        print(f'{"configuration":<28}{"memory MB":>10}{"ratio":>8}{"encode s":>10}{"p50 ms":>9}{"p95 ms":>9}'
+              f'{"recall@" + str(args.k):>11}')
+        exact_memory = exact_index.memory_bytes()
+        print(f'{"float32 (exact)":<28}{exact_memory / 2 ** 20:>10.1f}{1:>8.1f}{0:>10.1f}'
+              f'{np.percentile(latencies, 50) * 1000:>9.2f}{np.percentile(latencies, 95) * 1000:>9.2f}{1:>11.3f}')
+
+        for configuration in args.configurations:
+            options = parse_configuration(configuration)
+            index = NumpyVectorIndex(
+                directory=directory,
+                compaction_threshold=1.0,
+                logger=logger,
+                quantizer=VectorQuantizer(storage_type=options['storage_type'],
+                                          pca_dimension=options['pca_dimension']),
+                rescore_candidates=options['rescore_candidates']
+            )
+            started_at = time.perf_counter()
+            memory = index.memory_bytes()
+            encode_seconds = time.perf_counter() - started_at
+
+            results, latencies = run_queries(index, queries, args.k)
+            recall = np.mean([len(exact & result) / len(exact) for exact, result in zip(exact_results, results)
+                              if exact])
+            print(f'{configuration:<28}{memory / 2 ** 20:>10.1f}{exact_memory / memory:>8.1f}{encode_seconds:>10.1f}'
+                  f'{np.percentile(latencies, 50) * 1000:>9.2f}{np.percentile(latencies, 95) * 1000:>9.2f}'
+                  f'{recall:>11.3f}')
+
+
+if __name__ == '__main__':
+    main()
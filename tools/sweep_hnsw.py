@@ -0,0 +1,105 @@
+"""
+Sweeps the HNSW settings of a Chroma collection: for every combination of M, construction ef and search ef it
+builds a collection, then measures its build time, query latency (p50/p95) and recall@k against a brute force
+search. Runs on the vectors of a persisted NumPy vector index or on a synthetic corpus.
+
+Usage: python -m tools.sweep_hnsw [--index <directory>] [--chunks 50000] [--metric cosine]
+       [--m 16 32] [--construction-ef 100 200] [--search-ef 10 50 100] [--k 10] [--queries 200]
+"""
+import argparse
+import itertools
+import logging
+import tempfile
+import time
+import numpy as np
+from langchain_chroma import Chroma
+from src.infra.configuration import ChromaDBConfiguration
+from src.rag.numpy_vector_store import NumpyVectorIndex
+from src.rag.vector_store import create_collection_metadata
+from tools.benchmark_vector_store import PrecomputedEmbeddings, CHROMA_BATCH_SIZE
+from tools.report_quantization import create_synthetic_index
+
+logger = logging.getLogger("AppLogger")
+
+def brute_force(vectors: np.ndarray, queries: np.ndarray, metric: str, k: int) -> list:
+    if metric == 'l2':
+        # |v - q|^2 ranks like |v|^2 - 2 v.q
+        scores = 2 * queries @ vectors.T - (vectors ** 2).sum(axis=1)
+    elif metric == 'cosine':
+        norms = np.linalg.norm(vectors, axis=1)
+        scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ vectors.T / norms
+    else:
+        scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [{str(row) for row in rows} for rows in top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--index', help='Directory of a persisted NumPy vector index to take the vectors from')
+    parser.add_argument('--chunks', type=int, default=50000, help='Size of the synthetic corpus')
+    parser.add_argument('--dimension', type=int, default=768, help='Dimension of the synthetic corpus')
+    parser.add_argument('--metric', default='cosine', choices=['l2', 'cosine', 'ip'])
+    parser.add_argument('--m', type=int, nargs='+', default=[16, 32])
+    parser.add_argument('--construction-ef', type=int, nargs='+', default=[100, 200])
+    parser.add_argument('--search-ef', type=int, nargs='+', default=[10, 50, 100])
+    parser.add_argument('--queries', type=int, default=200, help='Number of queries')
+    parser.add_argument('--k', type=int, default=10, help='Number of results per query')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as index_directory:
+        index = NumpyVectorIndex(directory=args.index, compaction_threshold=1.0, logger=logger) if args.index \
+            else create_synthetic_index(index_directory, args.chunks, args.dimension)
+        live_rows = np.flatnonzero(~index.deleted)
+        vectors = np.array(index.vectors[live_rows])
+
+    generator = np.random.default_rng(1)
+    query_rows = generator.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[query_rows] + 0.5 * generator.standard_normal((len(query_rows), vectors.shape[1]),
+                                                                     dtype=np.float32) / np.sqrt(vectors.shape[1])
+
+    ids = [str(row) for row in range(len(vectors))]
+    texts = [f'{row} chunk' for row in range(len(vectors))]
+    embeddings = PrecomputedEmbeddings(vectors=vectors)
+    ground_truth = brute_force(vectors, queries, args.metric, args.k)
+
+    print(f'{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, '
+          f'metric {args.metric}, k={args.k}')
+    print(f'{"M":>4}{"construction ef":>17}{"search ef":>11}{"build s":>9}{"p50 ms":>9}{"p95 ms":>9}'
+          f'{"recall@" + str(args.k):>11}')
+    for m, construction_ef, search_ef in itertools.product(args.m, args.construction_ef, args.search_ef):
+        configuration = ChromaDBConfiguration(
+            persist_directory='',
+            collection_name='sweep',
+            distance_metric=args.metric,
+            hnsw_m=m,
+            hnsw_construction_ef=construction_ef,
+            hnsw_search_ef=search_ef
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            started_at = time.perf_counter()
+            vector_store = Chroma(
+                collection_name=configuration.collection_name,
+                embedding_function=embeddings,
+                persist_directory=directory,
+                collection_metadata=create_collection_metadata(chroma_db_config=configuration)
+            )
+            for start in range(0, len(ids), CHROMA_BATCH_SIZE):
+                vector_store.add_texts(texts=texts[start:start + CHROMA_BATCH_SIZE],
+                                       ids=ids[start:start + CHROMA_BATCH_SIZE])
+            build_seconds = time.perf_counter() - started_at
+
+            latencies = []
+            recalls = []
+            for query, expected in zip(queries, ground_truth):
+                started_at = time.perf_counter()
+                documents = vector_store.similarity_search_by_vector(embedding=query.tolist(), k=args.k)
+                latencies.append(time.perf_counter() - started_at)
+                recalls.append(len(expected & {document.id for document in documents}) / len(expected))
+
+        print(f'{m:>4}{construction_ef:>17}{search_ef:>11}{build_seconds:>9.1f}'
+              f'{np.percentile(latencies, 50) * 1000:>9.2f}{np.percentile(latencies, 95) * 1000:>9.2f}'
+              f'{np.mean(recalls):>11.3f}')
+
+
+if __name__ == '__main__':
+    main()